@@ -0,0 +1,128 @@
+# agregados.py
+import json
+from sqlalchemy import text
+
+# Contagens por (dia, faixa etária, campo, valor) mantidas por salvar_resposta.
+# Os gráficos do Painel do Escritor leem daqui em vez de expandir todo o JSON a cada rerun.
+CAMPOS_AGREGADOS = [
+    "idade",
+    "formato_livro",
+    "generos",
+    "objetivo_leitura",
+    "sentimento_livro",
+    "frequencia_leitura",
+    "narrativa",
+    "tamanho_livro",
+]
+
+def _pd():
+    # Importado sob demanda: só as telas de gráficos precisam das séries
+    import pandas as pd
+    return pd
+
+def criar_tabela_agregados(engine):
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT to_regclass('agregados_respostas')")).scalar():
+            return
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS agregados_respostas (
+                dia DATE NOT NULL,
+                idade TEXT NOT NULL,
+                campo TEXT NOT NULL,
+                valor TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dia, idade, campo, valor)
+            );
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS agregados_idade_idx ON agregados_respostas (idade, campo);
+        """))
+    reconstruir_agregados(engine)
+
+def _contribuicoes(dados):
+    for campo in CAMPOS_AGREGADOS:
+        valor = dados.get(campo)
+        if not valor:
+            continue
+        if campo == "generos":
+            for genero in valor.split(", "):
+                yield campo, genero
+        else:
+            yield campo, valor
+
+def aplicar_resposta(conn, dados, data_envio, sinal=1):
+    # sinal=+1 soma a resposta às contagens; sinal=-1 desfaz uma resposta anterior
+    if isinstance(dados, str):
+        dados = json.loads(dados)
+    linhas = [
+        {"dia": data_envio.date(), "idade": dados.get("idade") or "", "campo": campo, "valor": valor, "delta": sinal}
+        for campo, valor in _contribuicoes(dados)
+    ]
+    if not linhas:
+        return
+    conn.execute(text("""
+        INSERT INTO agregados_respostas (dia, idade, campo, valor, total)
+        VALUES (:dia, :idade, :campo, :valor, :delta)
+        ON CONFLICT (dia, idade, campo, valor) DO UPDATE
+        SET total = agregados_respostas.total + EXCLUDED.total
+    """), linhas)
+    if sinal < 0:
+        conn.execute(text("""
+            DELETE FROM agregados_respostas WHERE dia = :dia AND total <= 0
+        """), {"dia": data_envio.date()})
+
+def reconstruir_agregados(engine):
+    # Recalcula as contagens de todas as respostas numa consulta só, no banco; os
+    # gêneros vêm separados por ", " como em _contribuicoes
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM agregados_respostas"))
+        if not conn.execute(text("SELECT to_regclass('respostas_formulario')")).scalar():
+            return
+        conn.execute(text("""
+            INSERT INTO agregados_respostas (dia, idade, campo, valor, total)
+            SELECT r.data_envio::date, COALESCE(r.dados->>'idade', ''), c.campo, v.valor, COUNT(*)
+            FROM respostas_formulario r
+            CROSS JOIN unnest(CAST(:campos AS TEXT[])) AS c(campo)
+            CROSS JOIN LATERAL unnest(CASE WHEN c.campo = 'generos'
+                                           THEN string_to_array(r.dados->>'generos', ', ')
+                                           ELSE ARRAY[r.dados->>c.campo] END) AS v(valor)
+            WHERE COALESCE(v.valor, '') <> ''
+            GROUP BY 1, 2, 3, 4
+        """), {"campos": CAMPOS_AGREGADOS})
+
+def opcoes_de_filtro(engine, inicio=None, fim=None):
+    # As faixas etárias oferecidas são as que existem dentro do período escolhido
+    with engine.connect() as conn:
+        datas = conn.execute(text("""
+            SELECT DISTINCT dia FROM agregados_respostas
+            WHERE campo = 'idade' AND total > 0
+            ORDER BY dia
+        """)).scalars().all()
+        faixas = conn.execute(text("""
+            SELECT DISTINCT idade FROM agregados_respostas
+            WHERE campo = 'idade' AND total > 0 AND idade <> ''
+              AND (CAST(:inicio AS DATE) IS NULL OR dia >= :inicio)
+              AND (CAST(:fim AS DATE) IS NULL OR dia <= :fim)
+            ORDER BY idade
+        """), {"inicio": inicio, "fim": fim}).scalars().all()
+    return datas, faixas
+
+def contagens_respostas(engine, inicio=None, fim=None, idade=None):
+    # Devolve {campo: Series valor -> total}, como o value_counts() de cada coluna
+    with engine.connect() as conn:
+        linhas = conn.execute(text("""
+            SELECT campo, valor, SUM(total) AS total FROM agregados_respostas
+            WHERE (CAST(:inicio AS DATE) IS NULL OR dia >= :inicio)
+              AND (CAST(:fim AS DATE) IS NULL OR dia <= :fim)
+              AND (CAST(:idade AS TEXT) IS NULL OR idade = :idade)
+            GROUP BY campo, valor
+            HAVING SUM(total) > 0
+        """), {"inicio": inicio, "fim": fim, "idade": idade}).fetchall()
+    contagens = {}
+    for campo, valor, total in linhas:
+        contagens.setdefault(campo, {})[valor] = int(total)
+    pd = _pd()
+    return {
+        campo: pd.Series(valores, name="count").sort_values(ascending=False)
+        for campo, valores in contagens.items()
+    }
@@ -0,0 +1,116 @@
+# banco.py
+import os
+import threading
+import time
+from collections import deque
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as TempoEsgotadoPool
+from sqlalchemy.pool import QueuePool
+from instrumentacao import instrumentar_engine
+
+# Um engine por processo, com o pool configurado por variáveis de ambiente. O Postgres
+# gerenciado tem limite de conexões: cada réplica usa no máximo POOL_SIZE + MAX_OVERFLOW.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT_SEGUNDOS", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE_SEGUNDOS", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "False", "")
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT_SEGUNDOS", "10"))
+# Keepalive TCP: uma conexão meio aberta (rede caiu sem FIN) vira erro em
+# ~KEEPALIVE + 3 * 10 s em vez de ficar pendurada
+KEEPALIVE = int(os.getenv("DB_KEEPALIVE_SEGUNDOS", "30"))
+
+_engines = {}
+_lock_engines = threading.Lock()
+
+class MetricasPool:
+    # Espera por conexão em cada checkout; guarda as últimas para os percentis
+    def __init__(self, tamanho_janela=1000):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.tempos_esgotados = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+        self.esperas = deque(maxlen=tamanho_janela)
+
+    def registrar(self, espera, esgotou=False):
+        with self.lock:
+            if esgotou:
+                self.tempos_esgotados += 1
+                return
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_maxima = max(self.espera_maxima, espera)
+            self.esperas.append(espera)
+
+    def resumo(self):
+        with self.lock:
+            esperas = sorted(self.esperas)
+            return {
+                "checkouts": self.checkouts,
+                "tempos_esgotados": self.tempos_esgotados,
+                "espera_media_ms": 1000 * self.espera_total / self.checkouts if self.checkouts else 0.0,
+                "espera_p95_ms": 1000 * esperas[int(0.95 * (len(esperas) - 1))] if esperas else 0.0,
+                "espera_maxima_ms": 1000 * self.espera_maxima,
+            }
+
+class _PoolMedido(QueuePool):
+    # QueuePool que mede quanto cada checkout esperou por uma conexão livre
+    def __init__(self, *args, metricas=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metricas = metricas or MetricasPool()
+
+    def recreate(self):
+        novo = super().recreate()
+        novo.metricas = self.metricas
+        return novo
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = super().connect()
+        except TempoEsgotadoPool:
+            self.metricas.registrar(time.perf_counter() - inicio, esgotou=True)
+            raise
+        self.metricas.registrar(time.perf_counter() - inicio)
+        return conexao
+
+def criar_engine(url, statement_timeout_ms=STATEMENT_TIMEOUT_MS):
+    # statement_timeout_ms=0 para migrações e cargas em lote, que podem passar do limite do app
+    connect_args = {"connect_timeout": CONNECT_TIMEOUT}
+    if KEEPALIVE:
+        connect_args.update(keepalives=1, keepalives_idle=KEEPALIVE, keepalives_interval=10, keepalives_count=3)
+    if statement_timeout_ms:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+    engine = create_engine(
+        url,
+        poolclass=_PoolMedido,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+    instrumentar_engine(engine)
+    return engine
+
+def obter_engine(url):
+    # O script do Streamlit roda de novo a cada interação; o engine (e o pool) não
+    with _lock_engines:
+        if url not in _engines:
+            _engines[url] = criar_engine(url)
+        return _engines[url]
+
+def metricas_pool(engine):
+    pool = engine.pool
+    metricas = pool.metricas.resumo() if isinstance(pool, _PoolMedido) else {}
+    return {
+        "tamanho": pool.size(),
+        "em_uso": pool.checkedout(),
+        "livres": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "limite": pool.size() + MAX_OVERFLOW,
+        **metricas,
+    }
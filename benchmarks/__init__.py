@@ -0,0 +1,2 @@
+# Benchmarks dos caminhos de dados da plataforma LitMe.
+# Uso: python -m benchmarks --url postgresql+psycopg2://usuario@localhost/litme_testes
@@ -0,0 +1,156 @@
+# benchmarks/__main__.py
+# Mede os caminhos de dados do app em várias escalas e grava os tempos em JSON,
+# para comparar execuções antes e depois de cada otimização.
+#
+# Uso: python -m benchmarks --url postgresql+psycopg2://usuario@localhost/litme_testes \
+#          [--escalas 500:30:500,5000:60:5000] [--repeticoes 5] [--saida resultados.json]
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import text
+import gamificacao
+from agregados import contagens_respostas, opcoes_de_filtro
+from llm import ModeloFalso, definir_backend, gerar_texto
+from respostas import carregar_dados, invalidar_cache_respostas, limpar_cache_respostas, pagina_respostas
+from resumo_perfis import perfis_para_resumo, resumir_perfis
+from similares import limpar_indice_similares, recomendacoes_locais
+from benchmarks.dados_sinteticos import analisar, popular_gamificacao, popular_respostas, schema_temporario
+
+SCHEMA = "benchmark_litme"
+ESCALAS_PADRAO = "500:30:500,5000:60:5000,20000:90:20000"
+
+# A consulta de ranking de antes do placar: soma todo o histórico a cada exibição
+RANKING_COMPLETO = """
+    SELECT u.username,
+           COALESCE(SUM(p.paginas_lidas), 0) + COUNT(*) FILTER (WHERE p.livro_finalizado) * 50 AS pontos
+    FROM usuarios u
+    LEFT JOIN progresso_leitura p ON u.username = p.username
+    GROUP BY u.username
+    ORDER BY pontos DESC
+"""
+
+def medir(funcao, repeticoes, preparar=None):
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        "repeticoes": repeticoes,
+        "min_ms": round(tempos[0], 3),
+        "mediana_ms": round(statistics.median(tempos), 3),
+        "p95_ms": round(tempos[int(0.95 * (len(tempos) - 1))], 3),
+        "max_ms": round(tempos[-1], 3),
+    }
+
+def _limpar_cache_llm(engine):
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM cache_llm"))
+
+def medir_escala(engine, usuarios, dias, respostas, repeticoes):
+    with engine.connect() as conn:
+        usuario = conn.execute(text("""
+            SELECT username FROM placar ORDER BY pontos DESC, username
+            OFFSET (SELECT COUNT(*) / 2 FROM placar) LIMIT 1
+        """)).scalar()
+        faixa = conn.execute(text("""
+            SELECT idade FROM respostas_formulario GROUP BY idade ORDER BY COUNT(*) DESC LIMIT 1
+        """)).scalar()
+        leitor, formulario = conn.execute(text("""
+            SELECT usuario, dados FROM respostas_formulario ORDER BY usuario LIMIT 1
+        """)).fetchone()
+
+    def ranking_completo():
+        with engine.connect() as conn:
+            conn.execute(text(RANKING_COMPLETO)).fetchall()
+
+    perfis = perfis_para_resumo(carregar_dados(engine))
+    casos = {
+        "carregar_dados_frio": (lambda: carregar_dados(engine), limpar_cache_respostas),
+        "carregar_dados_incremental": (lambda: carregar_dados(engine), invalidar_cache_respostas),
+        "carregar_dados_quente": (lambda: carregar_dados(engine), None),
+        "carregar_dados_faixa_frio": (lambda: carregar_dados(engine, idade=faixa), limpar_cache_respostas),
+        "contagens_respostas": (lambda: contagens_respostas(engine), None),
+        "contagens_respostas_faixa": (lambda: contagens_respostas(engine, idade=faixa), None),
+        "opcoes_de_filtro": (lambda: opcoes_de_filtro(engine), None),
+        "pagina_respostas": (lambda: pagina_respostas(engine, pagina=2), None),
+        "calcular_pontos_e_nivel": (lambda: gamificacao.calcular_pontos_e_nivel(engine, usuario), None),
+        "verificar_conquistas": (lambda: gamificacao.verificar_conquistas(engine, usuario), None),
+        "carregar_painel_gamificacao": (lambda: gamificacao.carregar_painel_gamificacao(engine, usuario), None),
+        "ranking_top": (lambda: gamificacao.ranking_top(engine), None),
+        "ranking_completo": (ranking_completo, None),
+        "similares_frio": (lambda: recomendacoes_locais(engine, formulario, leitor), limpar_indice_similares),
+        "similares_quente": (lambda: recomendacoes_locais(engine, formulario, leitor), None),
+        "resumir_perfis_frio": (lambda: resumir_perfis(engine, perfis, gerar_texto), lambda: _limpar_cache_llm(engine)),
+        "resumir_perfis_quente": (lambda: resumir_perfis(engine, perfis, gerar_texto), None),
+    }
+    medicoes = {}
+    for nome, (funcao, preparar) in casos.items():
+        medicoes[nome] = medir(funcao, repeticoes, preparar)
+        print(f"  {nome}: mediana {medicoes[nome]['mediana_ms']:.1f} ms", file=sys.stderr)
+    return {"usuarios": usuarios, "dias": dias, "respostas": respostas, "medicoes": medicoes}
+
+def _versao_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos de dados da plataforma.")
+    parser.add_argument("--url", required=True, help="URL de um Postgres local ou de testes")
+    parser.add_argument("--escalas", default=ESCALAS_PADRAO,
+                        help="lista de usuarios:dias:respostas separada por vírgulas")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    # ranking_top e verificar_conquistas desenham com st.*; fora de `streamlit run` cada
+    # chamada gera um aviso de ScriptRunContext que só polui a saída
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(lambda registro: False)
+    definir_backend(ModeloFalso(atraso=0))
+
+    resultado = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "commit": _versao_git(),
+        "python": platform.python_version(),
+        "repeticoes": args.repeticoes,
+        "escalas": [],
+    }
+    for escala in args.escalas.split(","):
+        usuarios, dias, respostas = (int(x) for x in escala.split(":"))
+        print(f"Escala {usuarios} usuários x {dias} dias, {respostas} respostas", file=sys.stderr)
+        with schema_temporario(args.url, SCHEMA) as engine:
+            if "postgres" not in resultado:
+                with engine.connect() as conn:
+                    resultado["postgres"] = conn.execute(text("SHOW server_version")).scalar()
+            inicio = time.perf_counter()
+            popular_gamificacao(engine, usuarios, dias)
+            popular_respostas(engine, respostas, dias)
+            analisar(engine)
+            carga = round(time.perf_counter() - inicio, 2)
+            limpar_cache_respostas()
+            medidas = medir_escala(engine, usuarios, dias, respostas, args.repeticoes)
+            medidas["carga_s"] = carga
+            resultado["escalas"].append(medidas)
+        limpar_cache_respostas()
+
+    saida = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(saida + "\n")
+    else:
+        print(saida)
+
+if __name__ == "__main__":
+    main()
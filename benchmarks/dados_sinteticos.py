@@ -0,0 +1,134 @@
+# benchmarks/dados_sinteticos.py
+# Gerador de dados sintéticos: leitores, histórico de leitura, conquistas, placar e
+# respostas do formulário com distribuições tiradas das opções do próprio formulário.
+# Tudo é criado em um schema descartável, nunca nas tabelas do app.
+import json
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+from agregados import reconstruir_agregados
+from gamificacao import recalcular_placar
+from llm import ModeloFalso
+from migracoes import migrar
+from prompts import codificar_formulario
+
+# Opções do formulário (streamlit_app.py) em ordem de popularidade: a primeira é a mais escolhida
+OPCOES_FORMULARIO = {
+    "idade": ["18 a 24", "25 a 34", "Menor de 18", "35 a 44", "45 a 60", "Acima de 60"],
+    "frequencia_leitura": ["Algumas vezes por semana", "Todos os dias", "Algumas vezes por mês", "Raramente"],
+    "tempo_leitura": ["30 minutos a 1 hora", "Menos de 30 minutos", "1 a 2 horas", "Mais de 2 horas"],
+    "local_leitura": ["Em casa", "No transporte público", "Em bibliotecas/cafés", "Outros lugares"],
+    "tipo_livro": ["Gosto dos dois", "Ficção", "Não ficção"],
+    "tamanho_livro": ["Médios (200-400 páginas)", "Não tenho preferência", "Curtos (-200 páginas)", "Longos (+400 páginas)"],
+    "narrativa": ["Equilibrado entre os dois", "Ação rápida", "Narrativa introspectiva"],
+    "sentimento_livro": ["Empolgado", "Reflexivo", "Inspirado", "Confortável", "Assustado"],
+    "questoes_sociais": ["Depende do tema", "Sim", "Prefiro histórias leves"],
+    "releitura": ["Um pouco dos dois", "Sempre procuro novas leituras", "Gosto de reler"],
+    "formato_livro": ["Físico", "Tanto faz", "Digital"],
+    "influencia": ["Sinopse e capa", "Amigos", "Críticas", "Premiações"],
+    "avaliacoes": ["Prefiro personalizadas", "Sim", "Tanto faz"],
+    "audiolivros": ["Não", "Depende", "Sim"],
+    "interesse_artigos": ["Às vezes", "Não", "Sim"],
+    "objetivo_leitura": ["Relaxar", "Aprender", "Desenvolvimento pessoal", "Conexão emocional", "Outros"],
+    "tipo_conteudo": ["Vídeos", "Textos longos", "Notícias", "Podcasts", "Blogs"],
+    "nivel_leitura": ["Intermediário", "Avançado", "Iniciante"],
+    "velocidade": ["Moderado", "Rápido", "Lento"],
+    "curiosidade": ["Sim", "Depende", "Não muito"],
+    "contexto_cultural": ["Sim", "Depende", "Prefiro minha realidade"],
+    "memoria": ["Equilibrada", "Complexa", "Simples"],
+    "leitura_em_ingles": ["Às vezes", "Não", "Sim"],
+}
+GENEROS = ["Fantasia", "Romance", "Mistério/Thriller", "Ficção científica", "Terror", "História",
+           "Desenvolvimento pessoal", "Biografia", "Filosofia", "Negócios", "Outro"]
+AUTORES = ["Machado de Assis", "Clarice Lispector", "J.K. Rowling", "Stephen King", "Agatha Christie", ""]
+AREAS = ["Psicologia", "História", "Computação", "Educação", "Biologia"]
+
+def _escolher(rng, opcoes):
+    # Popularidade decrescente (Zipf): a opção i tem peso 1 / (i + 1)
+    return rng.choices(opcoes, weights=[1 / (i + 1) for i in range(len(opcoes))])[0]
+
+def gerar_formulario(rng):
+    dados = {campo: _escolher(rng, opcoes) for campo, opcoes in OPCOES_FORMULARIO.items()}
+    generos = sorted(set(_escolher(rng, GENEROS) for _ in range(rng.randint(1, 4))), key=GENEROS.index)
+    dados["generos"] = ", ".join(generos)
+    dados["genero_outro"] = "Poesia" if "Outro" in generos else ""
+    dados["autor_favorito"] = _escolher(rng, AUTORES)
+    dados["area_academica"] = _escolher(rng, AREAS) if dados["interesse_artigos"] != "Não" else ""
+    return dados
+
+@contextmanager
+def schema_temporario(url, schema, manter=False):
+    # Engine apontado para um schema vazio, já migrado; o schema é apagado na saída
+    base = create_engine(url)
+    with base.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_engine(url, connect_args={"options": f"-c search_path={schema}"})
+    try:
+        migrar(engine)
+        yield engine
+    finally:
+        engine.dispose()
+        if not manter:
+            with base.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        base.dispose()
+
+def popular_gamificacao(engine, usuarios, dias):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO usuarios (username, nome, senha_hash)
+            SELECT 'leitor' || i, 'Leitor ' || i, md5(i::text) FROM generate_series(1, :n) AS i
+            ON CONFLICT (username) DO NOTHING
+        """), {"n": usuarios})
+        # Cada leitor lê em ~60% dos dias e finaliza um livro em ~3% deles
+        conn.execute(text("""
+            INSERT INTO progresso_leitura (username, data, paginas_lidas, livro_finalizado)
+            SELECT 'leitor' || i, CURRENT_DATE - d, 1 + (hashtext(i || '-' || d) & 63), (hashtext(d || '-' || i) & 31) = 0
+            FROM generate_series(1, :n) AS i, generate_series(0, :dias - 1) AS d
+            WHERE (hashtext(i::text || d::text) & 7) < 5
+            ON CONFLICT (username, data) DO NOTHING
+        """), {"n": usuarios, "dias": dias})
+        conn.execute(text("""
+            INSERT INTO conquistas (username, nome_conquista, data_conquista)
+            SELECT 'leitor' || i, nome, CURRENT_TIMESTAMP - (i % 30) * INTERVAL '1 day'
+            FROM generate_series(1, :n) AS i,
+                 unnest(ARRAY['Leu 100 páginas!', 'Primeiro livro finalizado', 'Leu 7 dias seguidos']) AS nome
+            WHERE (hashtext(i || nome) & 3) <> 0
+            ON CONFLICT DO NOTHING
+        """), {"n": usuarios})
+        recalcular_placar(conn)
+
+def popular_respostas(engine, quantidade, dias, semente=42, tamanho_lote=2000):
+    # Respostas de 'leitor1'..'leitorN' espalhadas pelos últimos `dias` dias; o perfil
+    # vem do modelo falso, como se tivesse sido gerado pela plataforma
+    rng = random.Random(semente)
+    modelo = ModeloFalso(atraso=0)
+    agora = datetime.now()
+    for inicio in range(1, quantidade + 1, tamanho_lote):
+        linhas = []
+        for i in range(inicio, min(inicio + tamanho_lote, quantidade + 1)):
+            dados = gerar_formulario(rng)
+            usuario = f"leitor{i}"
+            linhas.append({
+                "usuario": usuario,
+                "dados": json.dumps(dados, ensure_ascii=False),
+                "idade": dados["idade"],
+                "perfil": modelo.responder(codificar_formulario(dados)),
+                "data_envio": agora - timedelta(seconds=rng.randint(0, dias * 86400)),
+            })
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO respostas_formulario (usuario, dados, idade, perfil_gerado, data_envio)
+                VALUES (:usuario, CAST(:dados AS JSONB), :idade, :perfil, :data_envio)
+                ON CONFLICT (usuario) DO NOTHING
+            """), linhas)
+    reconstruir_agregados(engine)
+
+def analisar(engine):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("""
+            VACUUM ANALYZE usuarios, progresso_leitura, conquistas, placar,
+                           respostas_formulario, agregados_respostas
+        """))
@@ -0,0 +1,81 @@
+# cache_llm.py
+import hashlib
+import os
+from datetime import timedelta
+from sqlalchemy import text
+
+# Respostas do modelo ficam guardadas por este tempo e até este número de entradas
+TTL_PADRAO = timedelta(hours=float(os.getenv("LLM_CACHE_TTL_HORAS", "168")))
+MAX_ENTRADAS = int(os.getenv("LLM_CACHE_MAX_ENTRADAS", "5000"))
+
+def criar_tabela_cache_llm(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS cache_llm (
+                chave TEXT PRIMARY KEY,
+                modelo TEXT NOT NULL,
+                resposta TEXT NOT NULL,
+                criado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                acessado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS cache_llm_acessado_idx ON cache_llm (acessado_em);
+        """))
+
+def chave_cache(modelo, prompt):
+    return hashlib.sha256(f"{modelo}\n{prompt}".encode("utf-8")).hexdigest()
+
+def buscar_no_cache(engine, chave, ttl=TTL_PADRAO):
+    with engine.begin() as conn:
+        return conn.execute(text("""
+            UPDATE cache_llm SET acessado_em = CURRENT_TIMESTAMP
+            WHERE chave = :chave AND criado_em >= CURRENT_TIMESTAMP - :ttl
+            RETURNING resposta
+        """), {"chave": chave, "ttl": ttl}).scalar()
+
+def guardar_no_cache(engine, chave, modelo, resposta, ttl=TTL_PADRAO, max_entradas=MAX_ENTRADAS):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO cache_llm (chave, modelo, resposta)
+            VALUES (:chave, :modelo, :resposta)
+            ON CONFLICT (chave) DO UPDATE
+            SET resposta = :resposta, criado_em = CURRENT_TIMESTAMP, acessado_em = CURRENT_TIMESTAMP
+        """), {"chave": chave, "modelo": modelo, "resposta": resposta})
+        # Remove entradas vencidas e, acima do limite, as menos acessadas
+        conn.execute(text("""
+            DELETE FROM cache_llm WHERE criado_em < CURRENT_TIMESTAMP - :ttl
+        """), {"ttl": ttl})
+        conn.execute(text("""
+            DELETE FROM cache_llm WHERE chave IN (
+                SELECT chave FROM cache_llm
+                ORDER BY acessado_em DESC
+                OFFSET :max_entradas
+            )
+        """), {"max_entradas": max_entradas})
+
+def gerar_com_cache(engine, modelo, prompt, gerar, forcar_novo=False, ttl=TTL_PADRAO):
+    # `gerar` recebe o prompt e devolve o texto; só é chamado em caso de falta no cache
+    chave = chave_cache(modelo, prompt)
+    if not forcar_novo:
+        resposta = buscar_no_cache(engine, chave, ttl)
+        if resposta is not None:
+            return resposta
+    resposta = gerar(prompt)
+    guardar_no_cache(engine, chave, modelo, resposta, ttl)
+    return resposta
+
+def gerar_com_cache_stream(engine, modelo, prompt, gerar_stream, forcar_novo=False, ttl=TTL_PADRAO):
+    # Versão em streaming: um acerto no cache é entregue de uma vez; numa falta os
+    # pedaços são repassados conforme chegam e o texto completo é guardado no final.
+    chave = chave_cache(modelo, prompt)
+    if not forcar_novo:
+        resposta = buscar_no_cache(engine, chave, ttl)
+        if resposta is not None:
+            yield resposta
+            return
+    partes = []
+    for parte in gerar_stream(prompt):
+        partes.append(parte)
+        yield parte
+    guardar_no_cache(engine, chave, modelo, "".join(partes), ttl)
@@ -0,0 +1,89 @@
+# exportacao.py
+import csv
+import io
+from sqlalchemy import text
+from respostas import CAMPOS_FORMULARIO, filtros_sql
+
+# Exportação das respostas filtradas em lotes, por um cursor do lado do servidor:
+# a leitura do banco e a codificação andam lote a lote. O arquivo final é montado
+# inteiro em bytes, que é o que o st.download_button aceita e guarda.
+TAMANHO_LOTE = 2000
+COLUNAS_EXPORTACAO = ["usuario", "perfil_gerado", "data_envio"] + CAMPOS_FORMULARIO
+
+def _lotes(engine, inicio=None, fim=None, idade=None, tamanho_lote=TAMANHO_LOTE):
+    where, parametros = filtros_sql(inicio, fim, idade)
+    with engine.connect() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=tamanho_lote).execute(text(f"""
+            SELECT usuario, perfil_gerado, data_envio, dados FROM respostas_formulario {where}
+            ORDER BY data_envio, usuario
+        """), parametros)
+        for lote in resultado.partitions(tamanho_lote):
+            yield lote
+
+def _valores(linha):
+    dados = linha.dados or {}
+    return [linha.usuario, linha.perfil_gerado, linha.data_envio] + [dados.get(c, "") for c in CAMPOS_FORMULARIO]
+
+def exportar_csv(engine, inicio=None, fim=None, idade=None, tamanho_lote=TAMANHO_LOTE):
+    # Gerador de pedaços em bytes: um cabeçalho e depois um pedaço por lote
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS_EXPORTACAO)
+    for lote in _lotes(engine, inicio, fim, idade, tamanho_lote):
+        for linha in lote:
+            escritor.writerow(_valores(linha))
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+class _Coletor(io.RawIOBase):
+    # Destino do ParquetWriter que entrega os bytes escritos a cada row group
+    def __init__(self):
+        self.pedacos = []
+        self.posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.pedacos.append(bytes(b))
+        self.posicao += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.posicao
+
+    def esvaziar(self):
+        pedacos, self.pedacos = self.pedacos, []
+        return b"".join(pedacos)
+
+def exportar_parquet(engine, inicio=None, fim=None, idade=None, tamanho_lote=TAMANHO_LOTE):
+    # Cada lote vira um row group; pyarrow só é importado quando alguém pede Parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema(
+        [("usuario", pa.string()), ("perfil_gerado", pa.string()), ("data_envio", pa.timestamp("us"))]
+        + [(c, pa.string()) for c in CAMPOS_FORMULARIO]
+    )
+    destino = _Coletor()
+    with pq.ParquetWriter(destino, esquema, compression="zstd") as escritor:
+        for lote in _lotes(engine, inicio, fim, idade, tamanho_lote):
+            colunas = list(zip(*(_valores(linha) for linha in lote)))
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)],
+                schema=esquema,
+            ))
+            yield destino.esvaziar()
+    yield destino.esvaziar()
+
+FORMATOS = {
+    "CSV": (exportar_csv, "dados_filtrados.csv", "text/csv"),
+    "Parquet": (exportar_parquet, "dados_filtrados.parquet", "application/vnd.apache.parquet"),
+}
+
+def gravar_exportacao(pedacos):
+    # Junta os pedaços no conteúdo do download
+    return b"".join(pedacos)
@@ -1,7 +1,183 @@
 # gamificacao.py
 import streamlit as st
+from dataclasses import dataclass, field
 from sqlalchemy import text
-from datetime import date
+
+META_DESAFIO_SEMANAL = 50
+
+@dataclass(frozen=True)
+class RegraConquista:
+    nome: str
+    contador: str  # coluna do placar
+    minimo: int
+
+# Conquistas são avaliadas sobre os contadores do placar a cada registro de leitura.
+# Para criar uma nova basta acrescentar a regra; nenhuma consulta ao histórico é necessária.
+REGRAS_CONQUISTAS = [
+    RegraConquista("Leu 100 páginas!", "paginas", 100),
+    RegraConquista("Leu 1000 páginas!", "paginas", 1000),
+    RegraConquista("Primeiro livro finalizado", "livros", 1),
+    RegraConquista("Cinco livros finalizados", "livros", 5),
+    RegraConquista("Leu 7 dias seguidos", "maior_sequencia", 7),
+    RegraConquista("Leu 30 dias seguidos", "maior_sequencia", 30),
+]
+
+@dataclass(frozen=True)
+class PainelGamificacao:
+    pontos: int
+    nivel: str
+    posicao: int
+    paginas_semana: int
+    sequencia_dias: int
+    conquistas: list = field(default_factory=list)
+    ranking: list = field(default_factory=list)
+
+    @property
+    def desafio_concluido(self):
+        return self.paginas_semana >= META_DESAFIO_SEMANAL
+
+def criar_tabela_placar(engine):
+    # O placar guarda os pontos já somados de cada usuário e é mantido por
+    # registrar_leitura, evitando o JOIN + ORDER BY sobre todo o histórico.
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT to_regclass('placar')")).scalar():
+            return
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS placar (
+                username TEXT PRIMARY KEY,
+                paginas INTEGER NOT NULL DEFAULT 0,
+                livros INTEGER NOT NULL DEFAULT 0,
+                pontos INTEGER NOT NULL DEFAULT 0
+            );
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS placar_pontos_idx ON placar (pontos DESC, username);
+        """))
+        # Carga inicial a partir do histórico existente
+        conn.execute(text("""
+            INSERT INTO placar (username, paginas, livros, pontos)
+            SELECT u.username,
+                   COALESCE(SUM(p.paginas_lidas), 0),
+                   COUNT(*) FILTER (WHERE p.livro_finalizado),
+                   COALESCE(SUM(p.paginas_lidas), 0) + COUNT(*) FILTER (WHERE p.livro_finalizado) * 50
+            FROM usuarios u
+            LEFT JOIN progresso_leitura p ON u.username = p.username
+            GROUP BY u.username
+            ON CONFLICT (username) DO NOTHING
+        """))
+
+def adicionar_contadores_placar(engine):
+    # Sequência de dias, maior sequência e páginas da semana passam a ficar no placar,
+    # atualizadas a cada registro; a carga inicial sai do histórico existente
+    with engine.begin() as conn:
+        conn.execute(text("""
+            ALTER TABLE placar
+                ADD COLUMN IF NOT EXISTS sequencia_atual INTEGER NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS maior_sequencia INTEGER NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS ultima_leitura DATE,
+                ADD COLUMN IF NOT EXISTS semana_inicio DATE,
+                ADD COLUMN IF NOT EXISTS paginas_semana INTEGER NOT NULL DEFAULT 0;
+        """))
+        recalcular_placar(conn)
+        conceder_conquistas_em_lote(conn)
+
+def recalcular_placar(conn, usuarios=None):
+    # Refaz os contadores a partir do histórico, de todos os usuários ou só dos informados
+    filtro = "" if usuarios is None else "WHERE username = ANY(:usuarios)"
+    filtro_usuarios = "" if usuarios is None else "WHERE u.username = ANY(:usuarios)"
+    conn.execute(text(f"""
+        WITH dias AS (
+            SELECT username, data, paginas_lidas, livro_finalizado,
+                   data - (ROW_NUMBER() OVER (PARTITION BY username ORDER BY data))::int AS grupo
+            FROM progresso_leitura {filtro}
+        ),
+        ilhas AS (
+            SELECT username, COUNT(*) AS dias, MAX(data) AS fim FROM dias GROUP BY username, grupo
+        ),
+        sequencias AS (
+            SELECT username,
+                   (ARRAY_AGG(dias ORDER BY fim DESC))[1] AS atual,
+                   MAX(dias) AS maior,
+                   MAX(fim) AS ultima
+            FROM ilhas GROUP BY username
+        ),
+        totais AS (
+            SELECT username,
+                   SUM(paginas_lidas) AS paginas,
+                   COUNT(*) FILTER (WHERE livro_finalizado) AS livros,
+                   COALESCE(SUM(paginas_lidas) FILTER (WHERE data >= date_trunc('week', CURRENT_DATE)), 0) AS semana
+            FROM dias GROUP BY username
+        )
+        INSERT INTO placar (username, paginas, livros, pontos, sequencia_atual, maior_sequencia,
+                            ultima_leitura, semana_inicio, paginas_semana)
+        SELECT u.username,
+               COALESCE(t.paginas, 0),
+               COALESCE(t.livros, 0),
+               COALESCE(t.paginas, 0) + COALESCE(t.livros, 0) * 50,
+               COALESCE(s.atual, 0),
+               COALESCE(s.maior, 0),
+               s.ultima,
+               date_trunc('week', CURRENT_DATE)::date,
+               COALESCE(t.semana, 0)
+        FROM usuarios u
+        LEFT JOIN totais t ON t.username = u.username
+        LEFT JOIN sequencias s ON s.username = u.username
+        {filtro_usuarios}
+        ON CONFLICT (username) DO UPDATE
+        SET paginas = EXCLUDED.paginas,
+            livros = EXCLUDED.livros,
+            pontos = EXCLUDED.pontos,
+            sequencia_atual = EXCLUDED.sequencia_atual,
+            maior_sequencia = EXCLUDED.maior_sequencia,
+            ultima_leitura = EXCLUDED.ultima_leitura,
+            semana_inicio = EXCLUDED.semana_inicio,
+            paginas_semana = EXCLUDED.paginas_semana
+    """), {"usuarios": usuarios})
+
+def atualizar_placar(conn, username, paginas_delta, livros_delta, paginas_hoje):
+    # Registro de hoje: soma os deltas, estende ou reinicia a sequência e zera as páginas
+    # da semana quando a semana virou. Devolve os contadores já atualizados.
+    return conn.execute(text("""
+        UPDATE placar
+        SET paginas = paginas + :p,
+            livros = livros + :l,
+            pontos = pontos + :p + :l * 50,
+            sequencia_atual = CASE WHEN ultima_leitura = CURRENT_DATE THEN sequencia_atual
+                                   WHEN ultima_leitura = CURRENT_DATE - 1 THEN sequencia_atual + 1
+                                   ELSE 1 END,
+            maior_sequencia = GREATEST(maior_sequencia,
+                                       CASE WHEN ultima_leitura = CURRENT_DATE THEN sequencia_atual
+                                            WHEN ultima_leitura = CURRENT_DATE - 1 THEN sequencia_atual + 1
+                                            ELSE 1 END),
+            ultima_leitura = CURRENT_DATE,
+            paginas_semana = CASE WHEN semana_inicio = date_trunc('week', CURRENT_DATE)::date
+                                  THEN paginas_semana + :p ELSE :hoje END,
+            semana_inicio = date_trunc('week', CURRENT_DATE)::date
+        WHERE username = :u
+        RETURNING paginas, livros, pontos, sequencia_atual, maior_sequencia, paginas_semana
+    """), {"u": username, "p": paginas_delta, "l": livros_delta, "hoje": paginas_hoje}).fetchone()
+
+def conceder_conquistas(conn, username, contadores):
+    # Avalia as regras sobre os contadores do placar; devolve só as conquistas novas
+    nomes = [r.nome for r in REGRAS_CONQUISTAS if getattr(contadores, r.contador) >= r.minimo]
+    if not nomes:
+        return []
+    return conn.execute(text("""
+        INSERT INTO conquistas (username, nome_conquista)
+        SELECT :u, nome FROM unnest(CAST(:nomes AS TEXT[])) AS nome
+        ON CONFLICT DO NOTHING
+        RETURNING nome_conquista
+    """), {"u": username, "nomes": nomes}).scalars().all()
+
+def conceder_conquistas_em_lote(conn, usuarios=None):
+    # Mesmas regras, aplicadas direto no placar para muitos usuários de uma vez
+    filtro = "" if usuarios is None else "AND username = ANY(:usuarios)"
+    for regra in REGRAS_CONQUISTAS:
+        conn.execute(text(f"""
+            INSERT INTO conquistas (username, nome_conquista)
+            SELECT username, :nome FROM placar WHERE {regra.contador} >= :minimo {filtro}
+            ON CONFLICT DO NOTHING
+        """), {"nome": regra.nome, "minimo": regra.minimo, "usuarios": usuarios})
 
 def registrar_leitura(engine, username):
     st.subheader("📈 Registro de Leitura")
@@ -9,32 +185,87 @@ def registrar_leitura(engine, username):
     finalizado = st.checkbox("Finalizou um livro hoje?")
     if st.button("Registrar leitura"):
         with engine.begin() as conn:
+            # Trava a linha do placar para serializar registros simultâneos do mesmo usuário
+            conn.execute(text("""
+                INSERT INTO placar (username) VALUES (:u) ON CONFLICT (username) DO NOTHING
+            """), {"u": username})
+            conn.execute(text("SELECT 1 FROM placar WHERE username = :u FOR UPDATE"), {"u": username})
+            anterior = conn.execute(text("""
+                SELECT paginas_lidas, livro_finalizado FROM progresso_leitura
+                WHERE username = :u AND data = CURRENT_DATE
+            """), {"u": username}).fetchone()
             conn.execute(text("""
                 INSERT INTO progresso_leitura (username, data, paginas_lidas, livro_finalizado)
                 VALUES (:u, CURRENT_DATE, :p, :f)
                 ON CONFLICT (username, data) DO UPDATE
                 SET paginas_lidas = :p, livro_finalizado = :f
             """), {"u": username, "p": paginas, "f": finalizado})
+            paginas_antes = anterior.paginas_lidas if anterior else 0
+            livro_antes = bool(anterior.livro_finalizado) if anterior else False
+            contadores = atualizar_placar(conn, username, paginas - paginas_antes,
+                                          int(finalizado) - int(livro_antes), paginas)
+            novas = conceder_conquistas(conn, username, contadores)
         st.success("Leitura registrada com sucesso!")
+        for nome in novas:
+            st.success(f"🏅 Nova conquista: {nome}")
 
 def calcular_pontos_e_nivel(engine, username):
     with engine.connect() as conn:
-        paginas, livros = conn.execute(text("""
-            SELECT COALESCE(SUM(paginas_lidas), 0), COUNT(*) FILTER (WHERE livro_finalizado)
-            FROM progresso_leitura WHERE username = :u
-        """), {"u": username}).fetchone()
-        pontos = paginas + livros * 50
+        pontos = conn.execute(text("""
+            SELECT COALESCE((SELECT pontos FROM placar WHERE username = :u), 0)
+        """), {"u": username}).scalar()
+        return pontos, nivel_por_pontos(pontos)
 
-        if pontos < 100:
-            nivel = "Iniciante"
-        elif pontos < 500:
-            nivel = "Aprendiz"
-        elif pontos < 1000:
-            nivel = "Explorador Literário"
-        else:
-            nivel = "Mestre das Letras"
+def nivel_por_pontos(pontos):
+    if pontos < 100:
+        return "Iniciante"
+    elif pontos < 500:
+        return "Aprendiz"
+    elif pontos < 1000:
+        return "Explorador Literário"
+    return "Mestre das Letras"
+
+def carregar_painel_gamificacao(engine, username, limite_ranking=5):
+    # Tudo o que a página de gamificação exibe, em uma única consulta e conexão
+    with engine.connect() as conn:
+        # Sequência e páginas da semana só valem se o último registro ainda as mantém
+        r = conn.execute(text("""
+            WITH meu AS (
+                SELECT COALESCE(MAX(pontos), 0) AS pontos,
+                       COALESCE(MAX(paginas_semana) FILTER (
+                           WHERE semana_inicio = date_trunc('week', CURRENT_DATE)::date), 0) AS paginas_semana,
+                       COALESCE(MAX(sequencia_atual) FILTER (
+                           WHERE ultima_leitura >= CURRENT_DATE - 1), 0) AS sequencia_dias
+                FROM placar WHERE username = :u
+            ),
+            top AS (
+                SELECT username, pontos FROM placar
+                ORDER BY pontos DESC, username
+                LIMIT :limite
+            )
+            SELECT
+                meu.pontos,
+                (SELECT 1 + COUNT(*) FROM placar WHERE placar.pontos > meu.pontos) AS posicao,
+                meu.paginas_semana,
+                meu.sequencia_dias,
+                (SELECT COALESCE(json_agg(json_build_object('nome', nome_conquista, 'data', data_conquista)
+                                          ORDER BY data_conquista DESC), '[]')
+                 FROM conquistas WHERE username = :u) AS conquistas,
+                (SELECT COALESCE(json_agg(json_build_object('username', username, 'pontos', pontos)
+                                          ORDER BY pontos DESC, username), '[]')
+                 FROM top) AS ranking
+            FROM meu
+        """), {"u": username, "limite": limite_ranking}).fetchone()
 
-        return pontos, nivel
+    return PainelGamificacao(
+        pontos=r.pontos,
+        nivel=nivel_por_pontos(r.pontos),
+        posicao=r.posicao,
+        paginas_semana=int(r.paginas_semana),
+        sequencia_dias=r.sequencia_dias,
+        conquistas=r.conquistas,
+        ranking=r.ranking,
+    )
 
 def mostrar_status(engine, username):
     pontos, nivel = calcular_pontos_e_nivel(engine, username)
@@ -42,71 +273,53 @@ def mostrar_status(engine, username):
     st.metric("Nível", nivel)
 
 def verificar_conquistas(engine, username):
+    # Reavalia as regras sobre o placar atual (uma linha), sem varrer o histórico
     with engine.begin() as conn:
-        conquistas = []
-        total_paginas = conn.execute(text("""
-            SELECT SUM(paginas_lidas) FROM progresso_leitura WHERE username = :u
-        """), {"u": username}).scalar() or 0
-        if total_paginas >= 100:
-            conquistas.append("Leu 100 páginas!")
-
-        finalizados = conn.execute(text("""
-            SELECT COUNT(*) FROM progresso_leitura WHERE username = :u AND livro_finalizado = TRUE
-        """), {"u": username}).scalar()
-        if finalizados >= 1:
-            conquistas.append("Primeiro livro finalizado")
-
-        dias = conn.execute(text("""
-            SELECT COUNT(*) FROM (
-                SELECT DISTINCT data FROM progresso_leitura WHERE username = :u
-                AND data >= CURRENT_DATE - INTERVAL '6 days'
-            ) dias
-        """), {"u": username}).scalar()
-        if dias == 7:
-            conquistas.append("Leu 7 dias seguidos")
+        contadores = conn.execute(text("""
+            SELECT paginas, livros, pontos, sequencia_atual, maior_sequencia, paginas_semana
+            FROM placar WHERE username = :u
+        """), {"u": username}).fetchone()
+        return conceder_conquistas(conn, username, contadores) if contadores else []
 
-        for c in conquistas:
-            conn.execute(text("""
-                INSERT INTO conquistas (username, nome_conquista)
-                VALUES (:u, :c)
-                ON CONFLICT DO NOTHING
-            """), {"u": username, "c": c})
+def mostrar_conquistas(painel):
+    st.subheader("🏅 Suas Conquistas")
+    if not painel.conquistas:
+        st.info("Nenhuma conquista ainda. Registre sua leitura!")
+    for c in painel.conquistas:
+        st.write(f"✅ {c['nome']} - {c['data']}")
 
-def mostrar_conquistas(engine, username):
+def posicao_no_ranking(engine, username):
+    # Colocação = 1 + quantos leitores têm mais pontos (varredura no índice de pontos)
     with engine.connect() as conn:
-        conquistas = conn.execute(text("""
-            SELECT nome_conquista, data_conquista FROM conquistas
-            WHERE username = :u
-            ORDER BY data_conquista DESC
-        """), {"u": username}).fetchall()
-        st.subheader("🏅 Suas Conquistas")
-        if not conquistas:
-            st.info("Nenhuma conquista ainda. Registre sua leitura!")
-        for c in conquistas:
-            st.write(f"✅ {c.nome_conquista} - {c.data_conquista}")
-
-def ranking_top(engine):
+        return conn.execute(text("""
+            SELECT 1 + COUNT(*) FROM placar
+            WHERE pontos > COALESCE((SELECT pontos FROM placar WHERE username = :u), 0)
+        """), {"u": username}).scalar()
+
+def ranking_top(engine, limite=5):
     with engine.connect() as conn:
         dados = conn.execute(text("""
-            SELECT u.username, COALESCE(SUM(p.paginas_lidas) + COUNT(*) FILTER (WHERE p.livro_finalizado) * 50, 0) as pontos
-            FROM usuarios u
-            LEFT JOIN progresso_leitura p ON u.username = p.username
-            GROUP BY u.username
-            ORDER BY pontos DESC
-            LIMIT 5
-        """)).fetchall()
+            SELECT username, pontos FROM placar
+            ORDER BY pontos DESC, username
+            LIMIT :limite
+        """), {"limite": limite}).fetchall()
         st.subheader("🏆 Ranking dos Leitores")
         for i, r in enumerate(dados, 1):
             st.write(f"{i}º {r.username} - {r.pontos} pontos")
 
+def mostrar_ranking(painel):
+    st.subheader("🏆 Ranking dos Leitores")
+    for i, r in enumerate(painel.ranking, 1):
+        st.write(f"{i}º {r['username']} - {r['pontos']} pontos")
+
 def desafio_ativo():
-    return "Leia 50 páginas esta semana para ganhar +50 pontos bônus"
+    return f"Leia {META_DESAFIO_SEMANAL} páginas esta semana para ganhar +50 pontos bônus"
 
 def validar_desafio(engine, username):
     with engine.connect() as conn:
         semana = conn.execute(text("""
-            SELECT SUM(paginas_lidas) FROM progresso_leitura
-            WHERE username = :u AND data >= CURRENT_DATE - INTERVAL '6 days'
+            SELECT paginas_semana FROM placar
+            WHERE username = :u AND semana_inicio = date_trunc('week', CURRENT_DATE)::date
         """), {"u": username}).scalar() or 0
-        return semana >= 50
+        return semana >= META_DESAFIO_SEMANAL
 
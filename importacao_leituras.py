@@ -0,0 +1,214 @@
+# importacao_leituras.py
+# Importação em lote do histórico de leitura (CSV com data, paginas_lidas e,
+# opcionalmente, livro_finalizado e username). As linhas são validadas de uma vez
+# com pandas, copiadas com COPY para uma tabela temporária e mescladas em
+# progresso_leitura num único INSERT ... ON CONFLICT. Placar e conquistas são
+# recalculados uma vez por lote, só para os usuários do lote. Um dia já gravado
+# substitui o do banco, a não ser que tenha vindo de um lote anterior da mesma
+# importação: aí as páginas se somam, como se o arquivo inteiro fosse um lote só.
+#
+# Uso: python importacao_leituras.py arquivo.csv [--usuario nome] [--lote 50000] [--validar]
+import argparse
+import io
+import os
+from datetime import date
+from pathlib import Path
+import streamlit as st
+from sqlalchemy import text
+from gamificacao import conceder_conquistas_em_lote, recalcular_placar
+from instrumentacao import registrar_dataframe
+
+TAMANHO_LOTE = int(os.getenv("IMPORTACAO_LEITURAS_LOTE", "50000"))
+MAX_PAGINAS_DIA = 5000
+VERDADEIROS = {"1", "true", "verdadeiro", "sim", "s", "yes", "y", "x"}
+FALSOS = {"", "0", "false", "falso", "nao", "não", "n", "no"}
+
+def _pd():
+    # Sob demanda, como nos demais módulos usados pelo app
+    import pandas as pd
+    return pd
+
+def validar_leituras(df, usuario=None):
+    # Devolve (válidas, erros). As válidas saem agrupadas por usuário e dia: vários
+    # registros do mesmo dia somam as páginas, e dias sem leitura (0 páginas, nenhum
+    # livro finalizado) ficam de fora para não contar na sequência. `linha` nos erros
+    # é a do arquivo.
+    pd = _pd()
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    obrigatorias = ["data", "paginas_lidas"] + ([] if usuario is not None else ["username"])
+    faltando = [c for c in obrigatorias if c not in df.columns]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+
+    texto = lambda coluna: df[coluna].astype("string").str.strip()
+    username = pd.Series(usuario, index=df.index, dtype="string") if usuario is not None else texto("username")
+    data = pd.to_datetime(texto("data"), format="%Y-%m-%d", errors="coerce")
+    data = data.fillna(pd.to_datetime(texto("data"), format="%d/%m/%Y", errors="coerce"))
+    paginas = pd.to_numeric(texto("paginas_lidas"), errors="coerce")
+    finalizado_texto = texto("livro_finalizado").str.lower().fillna("") if "livro_finalizado" in df.columns \
+        else pd.Series("", index=df.index, dtype="string")
+    finalizado = finalizado_texto.isin(VERDADEIROS)
+
+    motivo = pd.Series(pd.NA, index=df.index, dtype="string")
+    for condicao, descricao in [
+        (username.isna() | (username == ""), "usuário vazio"),
+        (data.isna(), "data inválida (use AAAA-MM-DD ou DD/MM/AAAA)"),
+        (data > pd.Timestamp(date.today()), "data no futuro"),
+        (paginas.isna() | (paginas % 1 != 0), "páginas inválidas"),
+        ((paginas < 0) | (paginas > MAX_PAGINAS_DIA), f"páginas fora de 0 a {MAX_PAGINAS_DIA}"),
+        (~(finalizado | finalizado_texto.isin(FALSOS)), "livro_finalizado inválido"),
+    ]:
+        motivo = motivo.mask(condicao.fillna(True) & motivo.isna(), descricao)
+
+    invalidas = motivo.notna()
+    erros = pd.DataFrame({"linha": df.index[invalidas] + 2, "motivo": motivo[invalidas].to_numpy()})
+    validas = pd.DataFrame({
+        "username": username[~invalidas],
+        "data": data[~invalidas].dt.date,
+        "paginas_lidas": paginas[~invalidas].astype("int64"),
+        "livro_finalizado": finalizado[~invalidas],
+    }).groupby(["username", "data"], as_index=False).agg({"paginas_lidas": "sum", "livro_finalizado": "any"})
+    return validas[(validas["paginas_lidas"] > 0) | validas["livro_finalizado"]], erros
+
+def importar_leituras(engine, validas, importados=None):
+    # Um lote já validado, numa transação: COPY, upsert e recálculo do placar.
+    # `importados` é o conjunto (username, data) dos lotes anteriores da mesma
+    # importação; os dias que se repetem somam em vez de substituir.
+    if validas.empty:
+        return {"linhas": 0, "inseridas": 0, "atualizadas": 0, "usuarios": 0, "usuarios_inexistentes": []}
+    registrar_dataframe("importacao_leituras", validas)
+    chaves = list(zip(validas["username"], validas["data"]))
+    validas = validas.assign(acumular=[c in importados for c in chaves] if importados else False)
+    buffer = io.StringIO()
+    validas[["username", "data", "paginas_lidas", "livro_finalizado", "acumular"]].to_csv(
+        buffer, index=False, header=False)
+    buffer.seek(0)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TEMP TABLE leituras_importadas (
+                username TEXT NOT NULL,
+                data DATE NOT NULL,
+                paginas_lidas INTEGER NOT NULL,
+                livro_finalizado BOOLEAN NOT NULL,
+                acumular BOOLEAN NOT NULL
+            ) ON COMMIT DROP
+        """))
+        with conn.connection.dbapi_connection.cursor() as cursor:
+            cursor.copy_expert("COPY leituras_importadas FROM STDIN WITH (FORMAT csv)", buffer)
+
+        inexistentes = conn.execute(text("""
+            WITH removidas AS (
+                DELETE FROM leituras_importadas i
+                WHERE NOT EXISTS (SELECT 1 FROM usuarios u WHERE u.username = i.username)
+                RETURNING username
+            )
+            SELECT DISTINCT username FROM removidas ORDER BY username
+        """)).scalars().all()
+        usuarios = conn.execute(text("""
+            SELECT DISTINCT username FROM leituras_importadas ORDER BY username
+        """)).scalars().all()
+        if not usuarios:
+            return {"linhas": 0, "inseridas": 0, "atualizadas": 0, "usuarios": 0,
+                    "usuarios_inexistentes": inexistentes}
+
+        # Mesma trava de registrar_leitura, na mesma ordem, para não disputar com ela
+        conn.execute(text("""
+            INSERT INTO placar (username) SELECT unnest(CAST(:usuarios AS TEXT[]))
+            ON CONFLICT (username) DO NOTHING
+        """), {"usuarios": usuarios})
+        conn.execute(text("""
+            SELECT 1 FROM placar WHERE username = ANY(:usuarios) ORDER BY username FOR UPDATE
+        """), {"usuarios": usuarios})
+        # Dias repetidos de lotes anteriores desta importação: soma com o que já foi gravado
+        conn.execute(text("""
+            UPDATE leituras_importadas i
+            SET paginas_lidas = i.paginas_lidas + p.paginas_lidas,
+                livro_finalizado = i.livro_finalizado OR p.livro_finalizado
+            FROM progresso_leitura p
+            WHERE i.acumular AND p.username = i.username AND p.data = i.data
+        """))
+        # O valor importado substitui o do dia, como um novo registro faria
+        inseridas, atualizadas = conn.execute(text("""
+            WITH mescladas AS (
+                INSERT INTO progresso_leitura (username, data, paginas_lidas, livro_finalizado)
+                SELECT username, data, paginas_lidas, livro_finalizado FROM leituras_importadas
+                ON CONFLICT (username, data) DO UPDATE
+                SET paginas_lidas = EXCLUDED.paginas_lidas, livro_finalizado = EXCLUDED.livro_finalizado
+                RETURNING (xmax = 0) AS nova
+            )
+            SELECT COUNT(*) FILTER (WHERE nova), COUNT(*) FILTER (WHERE NOT nova) FROM mescladas
+        """)).fetchone()
+
+        recalcular_placar(conn, usuarios)
+        conceder_conquistas_em_lote(conn, usuarios)
+    if importados is not None:
+        importados.update(chaves)
+    return {"linhas": inseridas + atualizadas, "inseridas": inseridas, "atualizadas": atualizadas,
+            "usuarios": len(usuarios), "usuarios_inexistentes": inexistentes}
+
+def mostrar_importacao(engine, username):
+    # Página de gamificação: o usuário importa o próprio histórico
+    with st.expander("📥 Importar histórico de leitura (CSV)"):
+        st.caption("Colunas: `data` (AAAA-MM-DD ou DD/MM/AAAA), `paginas_lidas` e, opcionalmente, "
+                   "`livro_finalizado` (sim/não). Dias já registrados são substituídos.")
+        arquivo = st.file_uploader("Arquivo CSV", type="csv", key="arquivo_leituras")
+        if arquivo is None:
+            return
+        pd = _pd()
+        try:
+            df = pd.read_csv(arquivo, dtype=str, keep_default_na=False, sep=None, engine="python")
+            validas, erros = validar_leituras(df.drop(columns=["username"], errors="ignore"), usuario=username)
+        except (ValueError, pd.errors.ParserError) as e:
+            st.error(f"❌ Não foi possível ler o arquivo: {e}")
+            return
+        st.write(f"{len(validas)} dias válidos, {len(erros)} linhas com problemas.")
+        if not erros.empty:
+            st.dataframe(erros.head(50), hide_index=True)
+        if not validas.empty and st.button(f"Importar {len(validas)} dias", key="btn_importar_leituras"):
+            resultado = importar_leituras(engine, validas)
+            st.success(f"Histórico importado: {resultado['inseridas']} dias novos e "
+                       f"{resultado['atualizadas']} atualizados. Pontos e conquistas recalculados.")
+
+def main():
+    pd = _pd()
+    from dotenv import load_dotenv
+    from banco import criar_engine
+
+    parser = argparse.ArgumentParser(description="Importa histórico de leitura a partir de um CSV.")
+    parser.add_argument("arquivo", help="CSV com data, paginas_lidas[, livro_finalizado][, username]")
+    parser.add_argument("--usuario", help="atribui todas as linhas a este usuário (ignora a coluna username)")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="linhas do arquivo por transação")
+    parser.add_argument("--validar", action="store_true", help="só valida, sem gravar")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).resolve().parent / ".env")
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if DATABASE_URL is None and not args.validar:
+        raise ValueError("A variável DATABASE_URL não foi encontrada.")
+    engine = None if args.validar else criar_engine(DATABASE_URL, statement_timeout_ms=0)
+
+    totais = {"linhas": 0, "inseridas": 0, "atualizadas": 0, "erros": 0}
+    importados = set()
+    for numero, pedaco in enumerate(pd.read_csv(args.arquivo, dtype=str, keep_default_na=False,
+                                                chunksize=args.lote), 1):
+        if args.usuario:
+            pedaco = pedaco.drop(columns=["username"], errors="ignore")
+        validas, erros = validar_leituras(pedaco, usuario=args.usuario)
+        totais["erros"] += len(erros)
+        for linha, motivo in erros.head(20).itertuples(index=False):
+            print(f"  linha {linha}: {motivo}")
+        if engine is not None:
+            resultado = importar_leituras(engine, validas, importados)
+            for chave in ("linhas", "inseridas", "atualizadas"):
+                totais[chave] += resultado[chave]
+            if resultado["usuarios_inexistentes"]:
+                print(f"  usuários inexistentes ignorados: {', '.join(resultado['usuarios_inexistentes'][:20])}")
+        print(f"Lote {numero}: {len(validas)} dias válidos, {len(erros)} linhas com problemas.")
+    if engine is None:
+        print(f"✅ Validação concluída: {totais['erros']} linhas com problemas.")
+    else:
+        print(f"✅ Importação concluída: {totais['inseridas']} dias novos, {totais['atualizadas']} atualizados, "
+              f"{totais['erros']} linhas com problemas.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# instrumentacao.py
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# Medições do processo em buffers circulares por série (nome + rótulos): duração de
+# cada execução do script por página, SQL por tipo de comando, chamadas ao modelo e
+# tamanho dos DataFrames. A página de métricas mostra os percentis; se
+# INSTRUMENTACAO_PROMETHEUS_ARQUIVO estiver definido, o resumo também é gravado
+# nesse arquivo no formato texto do Prometheus.
+TAMANHO_BUFFER = int(os.getenv("INSTRUMENTACAO_BUFFER", "2000"))
+ARQUIVO_PROMETHEUS = os.getenv("INSTRUMENTACAO_PROMETHEUS_ARQUIVO")
+INTERVALO_EXPORTACAO = float(os.getenv("INSTRUMENTACAO_EXPORTACAO_SEGUNDOS", "15"))
+QUANTIS = (0.5, 0.95, 0.99)
+
+class _Serie:
+    def __init__(self):
+        self.valores = deque(maxlen=TAMANHO_BUFFER)
+        self.contagem = 0
+        self.soma = 0.0
+
+class _Execucao:
+    # Acumula o SQL feito pela thread do script durante uma execução
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.sql_ms = 0.0
+
+_lock = threading.Lock()
+_series = {}
+_local = threading.local()
+_ultimas_execucoes = deque(maxlen=50)
+_ultima_exportacao = 0.0
+
+def registrar(nome, valor, **rotulos):
+    chave = (nome, tuple(sorted(rotulos.items())))
+    with _lock:
+        serie = _series.get(chave)
+        if serie is None:
+            serie = _series[chave] = _Serie()
+        serie.valores.append(valor)
+        serie.contagem += 1
+        serie.soma += valor
+
+def _quantil(ordenados, q):
+    return ordenados[int(q * (len(ordenados) - 1))]
+
+def resumo():
+    with _lock:
+        copias = [(nome, dict(rotulos), sorted(s.valores), s.contagem, s.soma)
+                  for (nome, rotulos), s in _series.items()]
+    linhas = []
+    for nome, rotulos, valores, contagem, soma in sorted(copias, key=lambda c: (c[0], sorted(c[1].items()))):
+        if not valores:
+            continue
+        linhas.append({
+            "metrica": nome,
+            "rotulos": ", ".join(f"{k}={v}" for k, v in sorted(rotulos.items())),
+            "total": contagem,
+            "media": soma / contagem,
+            **{f"p{int(q * 100)}": _quantil(valores, q) for q in QUANTIS},
+            "max": valores[-1],
+        })
+    return linhas
+
+def ultimas_execucoes():
+    with _lock:
+        return list(_ultimas_execucoes)
+
+# --- Execuções do script do Streamlit ---
+
+def iniciar_execucao():
+    _local.execucao = _Execucao()
+
+def finalizar_execucao(pagina):
+    # Chamado no fim do script, quando a página já é conhecida; execuções
+    # interrompidas por st.rerun() ou st.stop() não são registradas
+    execucao = getattr(_local, "execucao", None)
+    _local.execucao = None
+    if execucao is None:
+        return
+    total_ms = (time.perf_counter() - execucao.inicio) * 1000
+    registrar("execucao_ms", total_ms, pagina=pagina)
+    registrar("execucao_sql_consultas", execucao.consultas, pagina=pagina)
+    registrar("execucao_sql_ms", execucao.sql_ms, pagina=pagina)
+    with _lock:
+        _ultimas_execucoes.appendleft({
+            "pagina": pagina,
+            "total_ms": round(total_ms, 1),
+            "consultas": execucao.consultas,
+            "sql_ms": round(execucao.sql_ms, 1),
+            "fim": time.strftime("%H:%M:%S"),
+        })
+    if ARQUIVO_PROMETHEUS:
+        exportar_prometheus_periodicamente(ARQUIVO_PROMETHEUS)
+
+# --- SQL ---
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("instrumentacao_inicios", []).append(time.perf_counter())
+
+def _depois(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("instrumentacao_inicios")
+    if not inicios:
+        return
+    duracao_ms = (time.perf_counter() - inicios.pop()) * 1000
+    comando = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+    registrar("sql_ms", duracao_ms, comando=comando)
+    execucao = getattr(_local, "execucao", None)
+    if execucao is not None:
+        execucao.consultas += 1
+        execucao.sql_ms += duracao_ms
+
+def _erro(contexto):
+    # Comando que falhou não chega a _depois: descarta o início empilhado em _antes,
+    # senão ele sobra na conexão do pool e desalinha as medições seguintes
+    if contexto.connection is None or contexto.execution_context is None:
+        return
+    inicios = contexto.connection.info.get("instrumentacao_inicios")
+    if inicios:
+        inicios.pop()
+
+def instrumentar_engine(engine):
+    if not event.contains(engine, "before_cursor_execute", _antes):
+        event.listen(engine, "before_cursor_execute", _antes)
+        event.listen(engine, "after_cursor_execute", _depois)
+        event.listen(engine, "handle_error", _erro)
+
+# --- Modelo e DataFrames ---
+
+def registrar_llm(modelo, operacao, duracao_s, tokens_entrada=None, tokens_saida=None):
+    registrar("llm_ms", duracao_s * 1000, modelo=modelo, operacao=operacao)
+    if tokens_entrada is not None:
+        registrar("llm_tokens_entrada", tokens_entrada, modelo=modelo)
+    if tokens_saida is not None:
+        registrar("llm_tokens_saida", tokens_saida, modelo=modelo)
+
+def registrar_dataframe(origem, df):
+    registrar("dataframe_linhas", len(df), origem=origem)
+    registrar("dataframe_mb", df.memory_usage(deep=True).sum() / 2**20, origem=origem)
+
+@contextmanager
+def medir(nome, **rotulos):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(nome, (time.perf_counter() - inicio) * 1000, **rotulos)
+
+# --- Exportação ---
+
+def _nome_prometheus(nome):
+    return "litme_" + re.sub(r"[^a-zA-Z0-9_]", "_", nome)
+
+def _rotulos_prometheus(rotulos):
+    if not rotulos:
+        return ""
+    partes = [f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+              for k, v in rotulos]
+    return "{" + ",".join(partes) + "}"
+
+def texto_prometheus():
+    with _lock:
+        copias = sorted(((nome, rotulos, sorted(s.valores), s.contagem, s.soma)
+                         for (nome, rotulos), s in _series.items()), key=lambda c: (c[0], c[1]))
+    linhas, declarados = [], set()
+    for nome, rotulos, valores, contagem, soma in copias:
+        metrica = _nome_prometheus(nome)
+        if metrica not in declarados:
+            linhas.append(f"# TYPE {metrica} summary")
+            declarados.add(metrica)
+        for q in QUANTIS:
+            if valores:
+                linhas.append(f"{metrica}{_rotulos_prometheus(rotulos + (('quantile', q),))} {_quantil(valores, q):.6g}")
+        linhas.append(f"{metrica}_count{_rotulos_prometheus(rotulos)} {contagem}")
+        linhas.append(f"{metrica}_sum{_rotulos_prometheus(rotulos)} {soma:.6g}")
+    return "\n".join(linhas) + "\n"
+
+def exportar_prometheus(caminho):
+    # Grava num temporário e renomeia, para o coletor nunca ler um arquivo pela metade
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        arquivo.write(texto_prometheus())
+    os.replace(temporario, caminho)
+
+def exportar_prometheus_periodicamente(caminho):
+    global _ultima_exportacao
+    with _lock:
+        if time.monotonic() - _ultima_exportacao < INTERVALO_EXPORTACAO:
+            return
+        _ultima_exportacao = time.monotonic()
+    exportar_prometheus(caminho)
@@ -0,0 +1,183 @@
+# llm.py
+import hashlib
+import os
+import random
+import threading
+import time
+from instrumentacao import registrar, registrar_llm
+from prompts import estimar_tokens
+
+# Cliente único do modelo para o processo: configura uma vez, aplica prazo por
+# chamada, tenta de novo falhas transitórias com espera aleatória crescente e
+# limita quantas chamadas rodam ao mesmo tempo, somando todas as sessões. O SDK do
+# Gemini é importado só na primeira chamada, para não atrasar a tela de login.
+MODELO_PADRAO = "gemini-2.0-flash"
+PRAZO_PADRAO = float(os.getenv("LLM_TIMEOUT_SEGUNDOS", "60"))
+TENTATIVAS = int(os.getenv("LLM_TENTATIVAS", "3"))
+ESPERA_BASE = float(os.getenv("LLM_ESPERA_BASE_SEGUNDOS", "1.0"))
+ESPERA_MAXIMA = float(os.getenv("LLM_ESPERA_MAXIMA_SEGUNDOS", "20"))
+MAX_CONCORRENCIA = int(os.getenv("LLM_MAX_CONCORRENCIA", "4"))
+
+
+_vagas = threading.BoundedSemaphore(MAX_CONCORRENCIA)
+_lock_backend = threading.Lock()
+_backend = None
+_erros_transitorios = None
+
+class LLMIndisponivel(Exception):
+    pass
+
+def erros_transitorios():
+    # Avaliado só quando uma exceção chega ao except, então não força o import do SDK
+    global _erros_transitorios
+    if _erros_transitorios is None:
+        from google.api_core import exceptions as erros_google
+        _erros_transitorios = (
+            erros_google.ResourceExhausted,
+            erros_google.TooManyRequests,
+            erros_google.ServiceUnavailable,
+            erros_google.InternalServerError,
+            erros_google.DeadlineExceeded,
+            ConnectionError,
+        )
+    return _erros_transitorios
+
+class ModeloFalso:
+    # Modelo local e determinístico para testes: o mesmo prompt gera sempre o mesmo
+    # texto, entregue em pedaços como no streaming do Gemini.
+    def __init__(self, tamanho_pedaco=24, atraso=0.05):
+        self.tamanho_pedaco = tamanho_pedaco
+        self.atraso = atraso
+
+    def responder(self, prompt, modelo=MODELO_PADRAO, prazo=PRAZO_PADRAO):
+        assinatura = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return (
+            "## Perfil Literário\n\n"
+            f"Resposta simulada ({assinatura}) para um prompt de {len(prompt)} caracteres.\n\n"
+            "## Recomendações de Livros\n\n"
+            "- Um livro de exemplo, escolhido pelo modelo falso.\n"
+        )
+
+    def gerar_stream(self, prompt, modelo=MODELO_PADRAO, prazo=PRAZO_PADRAO):
+        texto = self.responder(prompt)
+        for i in range(0, len(texto), self.tamanho_pedaco):
+            if self.atraso:
+                time.sleep(self.atraso)
+            yield texto[i:i + self.tamanho_pedaco]
+
+class ModeloGemini:
+    # Configurado uma vez; os GenerativeModel são reaproveitados por nome
+    def __init__(self, api_key):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.modelos = {}
+        self._uso = threading.local()
+
+    def _modelo(self, modelo):
+        if modelo not in self.modelos:
+            self.modelos[modelo] = self.genai.GenerativeModel(modelo)
+        return self.modelos[modelo]
+
+    def _guardar_uso(self, resposta):
+        uso = getattr(resposta, "usage_metadata", None)
+        if uso is not None:
+            self._uso.tokens = (uso.prompt_token_count, uso.candidates_token_count)
+
+    def tokens_da_ultima_chamada(self):
+        # Contagem informada pela API para a última chamada desta thread
+        tokens, self._uso.tokens = getattr(self._uso, "tokens", None), None
+        return tokens
+
+    def responder(self, prompt, modelo=MODELO_PADRAO, prazo=PRAZO_PADRAO):
+        resposta = self._modelo(modelo).generate_content(prompt, request_options={"timeout": prazo})
+        self._guardar_uso(resposta)
+        return resposta.text
+
+    def gerar_stream(self, prompt, modelo=MODELO_PADRAO, prazo=PRAZO_PADRAO):
+        resposta = self._modelo(modelo).generate_content(prompt, stream=True, request_options={"timeout": prazo})
+        for pedaco in resposta:
+            if pedaco.parts:
+                yield pedaco.text
+        self._guardar_uso(resposta)
+
+def usando_modelo_falso():
+    return os.getenv("LLM_BACKEND", "gemini") == "falso"
+
+def obter_backend():
+    global _backend
+    with _lock_backend:
+        if _backend is None:
+            _backend = ModeloFalso() if usando_modelo_falso() else ModeloGemini(os.getenv("GEMINI_API_KEY"))
+        return _backend
+
+def definir_backend(backend):
+    # Troca o backend do processo (benchmarks e scripts usam um ModeloFalso próprio)
+    global _backend
+    with _lock_backend:
+        _backend = backend
+
+def _esperar_antes_de(tentativa, limite):
+    # Espera exponencial com jitter completo, sem passar do prazo da chamada
+    espera = random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** tentativa))
+    if time.monotonic() + espera >= limite:
+        return False
+    time.sleep(espera)
+    return True
+
+def _ocupar_vaga(limite):
+    if not _vagas.acquire(timeout=max(0.0, limite - time.monotonic())):
+        raise LLMIndisponivel("o modelo está ocupado com outras solicitações; tente novamente em instantes")
+
+def _registrar_chamada(backend, modelo, operacao, inicio, prompt, texto):
+    # Usa a contagem de tokens da API quando o backend informa; senão, a estimativa local
+    tokens = getattr(backend, "tokens_da_ultima_chamada", lambda: None)()
+    entrada, saida = tokens or (estimar_tokens(prompt), estimar_tokens(texto))
+    registrar_llm(modelo, operacao, time.monotonic() - inicio, entrada, saida)
+
+def gerar_texto(prompt, modelo=MODELO_PADRAO, prazo=PRAZO_PADRAO):
+    inicio = time.monotonic()
+    limite = inicio + prazo
+    _ocupar_vaga(limite)
+    try:
+        for tentativa in range(TENTATIVAS):
+            try:
+                restante = max(1.0, limite - time.monotonic())
+                backend = obter_backend()
+                texto = backend.responder(prompt, modelo=modelo, prazo=restante)
+                _registrar_chamada(backend, modelo, "texto", inicio, prompt, texto)
+                return texto
+            except erros_transitorios() as e:
+                if tentativa == TENTATIVAS - 1 or not _esperar_antes_de(tentativa, limite):
+                    registrar("llm_falhas", 1, modelo=modelo, operacao="texto")
+                    raise LLMIndisponivel(f"o modelo não respondeu: {e}") from e
+    finally:
+        _vagas.release()
+
+def gerar_stream(prompt, modelo=MODELO_PADRAO, prazo=PRAZO_PADRAO):
+    # Entrega o texto à medida que os tokens chegam. Só tenta de novo enquanto nada
+    # foi entregue; o prazo vale para a resposta inteira, não para cada pedaço.
+    inicio = time.monotonic()
+    limite = inicio + prazo
+    _ocupar_vaga(limite)
+    try:
+        for tentativa in range(TENTATIVAS):
+            pedacos = []
+            try:
+                restante = max(1.0, limite - time.monotonic())
+                backend = obter_backend()
+                for pedaco in backend.gerar_stream(prompt, modelo=modelo, prazo=restante):
+                    if time.monotonic() > limite:
+                        raise LLMIndisponivel(f"o modelo excedeu o prazo de {prazo:g}s")
+                    if not pedacos:
+                        registrar("llm_primeiro_pedaco_ms", (time.monotonic() - inicio) * 1000, modelo=modelo)
+                    pedacos.append(pedaco)
+                    yield pedaco
+                _registrar_chamada(backend, modelo, "stream", inicio, prompt, "".join(pedacos))
+                return
+            except erros_transitorios() as e:
+                if pedacos or tentativa == TENTATIVAS - 1 or not _esperar_antes_de(tentativa, limite):
+                    registrar("llm_falhas", 1, modelo=modelo, operacao="stream")
+                    raise LLMIndisponivel(f"o modelo não respondeu: {e}") from e
+    finally:
+        _vagas.release()
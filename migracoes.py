@@ -0,0 +1,170 @@
+# migracoes.py
+# Esquema do banco em migrações numeradas, aplicadas uma vez por processo na
+# inicialização do app ou pela linha de comando. As versões já aplicadas ficam
+# em schema_migrations; um advisory lock impede dois processos de migrar juntos.
+#
+# Uso: python migracoes.py [--listar]
+import argparse
+import os
+import threading
+from pathlib import Path
+from sqlalchemy import text
+from banco import criar_engine
+from agregados import criar_tabela_agregados
+from cache_llm import criar_tabela_cache_llm
+from gamificacao import adicionar_contadores_placar, criar_tabela_placar
+from respostas import adicionar_versao_respostas, migrar_respostas_formulario, remover_respostas_generos
+from tarefas import adicionar_chave_jobs, criar_tabela_jobs
+
+CHAVE_LOCK = 7_310_411  # identificador do advisory lock das migrações
+
+_aplicadas = False
+_lock_aplicacao = threading.Lock()
+
+def _executar(engine, *comandos):
+    with engine.begin() as conn:
+        for comando in comandos:
+            conn.execute(text(comando))
+
+def _usuarios(engine):
+    _executar(engine, """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            username TEXT PRIMARY KEY,
+            nome TEXT,
+            senha_hash TEXT
+        );
+    """)
+
+def _progresso_leitura(engine):
+    _executar(engine, """
+        CREATE TABLE IF NOT EXISTS progresso_leitura (
+            username TEXT NOT NULL REFERENCES usuarios(username) ON DELETE CASCADE,
+            data DATE NOT NULL,
+            paginas_lidas INTEGER NOT NULL DEFAULT 0 CHECK (paginas_lidas >= 0),
+            livro_finalizado BOOLEAN NOT NULL DEFAULT FALSE,
+            PRIMARY KEY (username, data)
+        );
+    """)
+
+def _conquistas(engine):
+    _executar(engine, """
+        CREATE TABLE IF NOT EXISTS conquistas (
+            username TEXT NOT NULL REFERENCES usuarios(username) ON DELETE CASCADE,
+            nome_conquista TEXT NOT NULL,
+            data_conquista TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (username, nome_conquista)
+        );
+    """)
+
+def _indices_gamificacao(engine):
+    # Os índices criados aqui foram desfeitos pela migração 13: duplicavam a chave
+    # primária ou não serviam a nenhuma consulta. Fica vazia para manter a numeração
+    pass
+
+def _sem_transacao(engine, *comandos):
+    # CREATE/DROP INDEX CONCURRENTLY não rodam dentro de transação
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for comando in comandos:
+            conn.execute(text(comando))
+
+def _remover_indices_gamificacao(engine):
+    # (username, data) já é a chave primária de progresso_leitura, e as conquistas de
+    # um usuário saem pela chave (username, nome_conquista); os índices extras só
+    # pesavam nas gravações. CONCURRENTLY para não bloquear as tabelas em produção
+    _sem_transacao(engine,
+                   "DROP INDEX CONCURRENTLY IF EXISTS progresso_usuario_data_idx",
+                   "DROP INDEX CONCURRENTLY IF EXISTS progresso_finalizados_idx",
+                   "DROP INDEX CONCURRENTLY IF EXISTS conquistas_usuario_data_idx")
+
+MIGRACOES = [
+    (1, "usuarios", _usuarios),
+    (2, "progresso_leitura", _progresso_leitura),
+    (3, "conquistas", _conquistas),
+    (4, "respostas_formulario", migrar_respostas_formulario),
+    (5, "placar", criar_tabela_placar),
+    (6, "cache_llm", criar_tabela_cache_llm),
+    (7, "jobs", criar_tabela_jobs),
+    (8, "agregados_respostas", criar_tabela_agregados),
+    (9, "indices_gamificacao", _indices_gamificacao),
+    (10, "contadores_placar", adicionar_contadores_placar),
+    (11, "versao_respostas", adicionar_versao_respostas),
+    (12, "remover_respostas_generos", remover_respostas_generos),
+    (13, "remover_indices_gamificacao", _remover_indices_gamificacao),
+    (14, "chave_jobs", adicionar_chave_jobs),
+]
+
+def versoes_aplicadas(engine):
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar():
+            return set()
+        return set(conn.execute(text("SELECT versao FROM schema_migrations")).scalars().all())
+
+def migrar(engine, saida=None):
+    # Aplica, em ordem, as migrações que faltam; devolve as versões aplicadas agora.
+    # O engine não deve ter statement_timeout: a espera pelo lock enquanto outra
+    # réplica migra, os DDL e os backfills podem levar minutos
+    with engine.connect() as trava:
+        trava.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": CHAVE_LOCK})
+        try:
+            _executar(engine, """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    versao INTEGER PRIMARY KEY,
+                    nome TEXT NOT NULL,
+                    aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            feitas = versoes_aplicadas(engine)
+            novas = []
+            for versao, nome, funcao in MIGRACOES:
+                if versao in feitas:
+                    continue
+                funcao(engine)
+                with engine.begin() as conn:
+                    conn.execute(text("""
+                        INSERT INTO schema_migrations (versao, nome) VALUES (:versao, :nome)
+                    """), {"versao": versao, "nome": nome})
+                novas.append(versao)
+                if saida:
+                    saida(f"Migração {versao:03d} ({nome}) aplicada.")
+            return novas
+        finally:
+            trava.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_LOCK})
+            trava.commit()
+
+def migrar_uma_vez(engine):
+    # Chamado a cada execução do script do Streamlit; só a primeira do processo vai ao banco
+    global _aplicadas
+    with _lock_aplicacao:
+        if _aplicadas:
+            return
+        # Engine próprio, sem o statement_timeout do engine do app
+        engine_migracoes = criar_engine(engine.url, statement_timeout_ms=0)
+        try:
+            migrar(engine_migracoes)
+        finally:
+            engine_migracoes.dispose()
+        _aplicadas = True
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Aplica as migrações do banco da plataforma.")
+    parser.add_argument("--listar", action="store_true", help="só mostra o estado de cada migração")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).resolve().parent / ".env")
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if DATABASE_URL is None:
+        raise ValueError("A variável DATABASE_URL não foi encontrada.")
+    engine = criar_engine(DATABASE_URL, statement_timeout_ms=0)
+
+    if args.listar:
+        feitas = versoes_aplicadas(engine)
+        for versao, nome, _ in MIGRACOES:
+            print(f"{versao:03d} {nome}: {'aplicada' if versao in feitas else 'pendente'}")
+        return
+    novas = migrar(engine, saida=print)
+    print(f"✅ Esquema atualizado ({len(novas)} migrações aplicadas).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# migrar_respostas.py
+# Converte respostas_formulario para o esquema com JSONB e coluna idade,
+# preenchendo as linhas existentes em lotes.
+#
+# Uso: python migrar_respostas.py [--lote 1000] [--reconstruir-agregados]
+import argparse
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+from banco import criar_engine
+from agregados import criar_tabela_agregados, reconstruir_agregados
+from respostas import migrar_respostas_formulario
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra e preenche as respostas do formulário.")
+    parser.add_argument("--lote", type=int, default=1000, help="respostas por transação")
+    parser.add_argument("--reconstruir-agregados", action="store_true",
+                        help="recalcula as contagens do Painel do Escritor ao final")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).resolve().parent / ".env")
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if DATABASE_URL is None:
+        raise ValueError("A variável DATABASE_URL não foi encontrada.")
+    engine = criar_engine(DATABASE_URL, statement_timeout_ms=0)
+
+    total = migrar_respostas_formulario(engine, tamanho_lote=args.lote, saida=print)
+    if args.reconstruir_agregados:
+        criar_tabela_agregados(engine)
+        reconstruir_agregados(engine)
+        print("Contagens do painel recalculadas.")
+    print(f"✅ Migração concluída: {total} respostas.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# prompts.py
+import hashlib
+import os
+from datetime import datetime
+
+# Montagem dos prompts enviados ao modelo, com estimativa de tokens e orçamento.
+# Populações grandes entram por uma amostra determinística e estratificada por
+# faixa etária e gênero; os dados do formulário vão em formato compacto.
+ORCAMENTO_PROMPT = int(os.getenv("PROMPT_ORCAMENTO_TOKENS", "12000"))
+ORCAMENTO_AMOSTRA = int(os.getenv("PROMPT_ORCAMENTO_AMOSTRA_TOKENS", "120000"))
+
+def _pd():
+    # Carregado só ao montar amostras
+    import pandas as pd
+    return pd
+
+def estimar_tokens(texto):
+    # Aproximação de ~4 caracteres por token, suficiente para dimensionar prompts e lotes
+    return len(texto) // 4 + 1
+
+def limitar_tokens(texto, orcamento):
+    limite = orcamento * 4
+    return texto if len(texto) <= limite else texto[:limite].rsplit(" ", 1)[0] + " [...]"
+
+def codificar_formulario(dados):
+    # Uma linha "campo: valor" por resposta preenchida, sem o recuo e as aspas do JSON
+    return "\n".join(f"{campo}: {valor}" for campo, valor in dados.items() if valor not in (None, "", []))
+
+def _estratos(df):
+    pd = _pd()
+    vazio = pd.Series("", index=df.index)
+    idade = df["idade"].fillna("") if "idade" in df.columns else vazio
+    genero = df["generos"].fillna("").str.split(", ").str[0] if "generos" in df.columns else vazio
+    return idade + "|" + genero
+
+def _ordem_estavel(usuario):
+    return hashlib.sha256(str(usuario).encode("utf-8")).hexdigest()
+
+def amostra_estratificada(df, orcamento=ORCAMENTO_AMOSTRA, coluna="perfil_gerado"):
+    # Cada estrato (faixa etária, primeiro gênero) recebe uma fatia do orçamento proporcional
+    # ao seu tamanho e a preenche na ordem do hash do usuário. A mesma população gera sempre
+    # a mesma amostra, e um leitor novo só entra no lugar de outro do seu estrato.
+    if df.empty or coluna not in df.columns:
+        return df.iloc[0:0]
+    df = df.dropna(subset=[coluna])
+    tokens = df[coluna].map(estimar_tokens)
+    total = int(tokens.sum())
+    if total <= orcamento:
+        return df
+    estratos = _estratos(df)
+    escolhidos = []
+    for _, indices in estratos.groupby(estratos).groups.items():
+        cota = orcamento * tokens[indices].sum() / total
+        usados = 0
+        for i in sorted(indices, key=lambda i: _ordem_estavel(df.at[i, "usuario"])):
+            if usados + tokens[i] > cota and usados:
+                break
+            escolhidos.append(i)
+            usados += tokens[i]
+    return df.loc[sorted(escolhidos)]
+
+def montar_prompt_perfil(dados):
+    return (
+        "**Atue como um PSICÓLOGO LITERÁRIO altamente perspicaz e intuitivo.**\n"
+        "Sua missão é ir MUITO ALÉM das respostas diretas do formulário abaixo. **Não cite, reitere, ou faça qualquer referência explícita às informações exatas que foram fornecidas.** Ou seja, não mencione a origem de nenhum dado, como 'a preferência por', 'a recusa em', 'o interesse em', que remetam diretamente a uma resposta do formulário.\n"
+        "Em vez disso, analise as entrelinhas para **TRAÇAR UM RETRATO PSICOLÓGICO REVELADOR e SURPREENDENTE do leitor, identificando suas tendências, motivações e anseios subjacentes.** Seu objetivo é apresentar insights que o próprio leitor, ao ler, dirá: 'Uau, eu não tinha percebido isso sobre mim!'.\n"
+        "Conecte os traços de forma fluida e integrada, como se estivesse descrevendo a essência de uma personalidade complexa, e não um conjunto de dados. Foque em:\n"
+        "1.  **Forças e Desafios Inerentes:** O que define intrinsecamente este leitor e onde pode haver pontos de crescimento.\n"
+        "2.  **Desejos Não Articulados:** O que o leitor busca na leitura que ele mesmo não consegue expressar claramente.\n"
+        "3.  **Paradoxos e Equilíbrios:** Onde há aparentemente uma contradição, mas na verdade revela uma característica única.\n"
+        "4.  **Implicações de Hábitos:** O que os hábitos de leitura (onde, quando, como) revelam sobre sua psicologia.\n\n"
+        "Apresente este 'diagnóstico literário' em uma narrativa única, profunda e sem clichês, focando na descoberta de traços que vão além do óbvio.\n\n"
+        "--- # Fim do Perfil\n\n" # Linha de separação clara
+        "**Com base EXCLUSIVAMENTE nas tendências e motivações REVELADAS neste retrato psicológico (e sem repetir NENHUM dado bruto do formulário, nem mesmo inferências óbvias que já estavam no formulário), RECOMENDE:**\n"
+        "1.  **Livros relevantes**, com justificativas que explorem as conexões com as **tendências e anseios mais profundos** revelados no perfil.\n"
+        "2.  **Artigos acadêmicos apropriados**, detalhando a conexão com **áreas de pesquisa que complementem ou desafiem** as motivações subjacentes identificadas no retrato.\n\n"
+        "**Além disso, identifique uma ou duas possíveis novas áreas ou gêneros que o leitor poderia explorar**, com base nas suas preferências e inferências do perfil, e **sugira um ou dois títulos** que se encaixem nessa expansão, justificando a sugestão.\n\n"
+        "**Estruture a resposta claramente com o '## Perfil Literário' primeiro, seguido por '## Recomendações de Livros', '## Recomendações de Artigos Acadêmicos' e, por último, '## Sugestões de Expansão de Interesses'.**\n"
+        f"**Dados do Formulário para Análise:**\n{codificar_formulario(dados)}"
+    )
+
+def montar_prompt_escritor(textos, faixa_info="", total_leitores=None, amostra=None,
+                           orcamento=ORCAMENTO_PROMPT):
+    data_atual = datetime.now().strftime("%B de %Y")
+    cabecalho = "Perfis analisados"
+    if amostra is not None and total_leitores is not None and amostra < total_leitores:
+        cabecalho += f" (amostra representativa de {amostra} de {total_leitores} leitores)"
+    instrucoes = f"""Hoje é {data_atual}. Você é um consultor literário com acesso a perfis reais de leitores brasileiros{faixa_info}.
+Seu objetivo é ajudar escritores a adaptar seus textos para alcançar esse público com mais impacto.
+
+Com base nos dados coletados da plataforma, analise os seguintes aspectos:
+1. Formatos de leitura mais utilizados (físico ou digital)
+2. Gêneros literários mais citados
+3. Objetivos que os leitores têm ao escolher um livro
+4. Sentimentos que os leitores buscam ao ler
+5. Faixa etária predominante dos leitores
+6. Frequência e tempo dedicado à leitura
+7. Estilos narrativos preferidos
+8. Tamanho de livro mais apreciado
+
+**A partir disso, gere recomendações práticas para escritores**, como:
+- Qual tipo de enredo pode envolver mais o leitor
+- Que estilo narrativo utilizar
+- Que tipo de linguagem é mais adequada
+- Como estruturar os personagens
+- Qual o tamanho ideal de livro
+- Como conectar emocionalmente com o leitor
+
+**Justifique cada recomendação com base nos dados analisados. Use termos, padrões e preferências reais dos leitores.**
+Não escreva como um chatbot. Não faça perguntas. Apenas forneça as sugestões com explicações claras e fundamentadas.
+
+{cabecalho}:
+"""
+    return instrucoes + limitar_tokens(textos, orcamento - estimar_tokens(instrucoes))
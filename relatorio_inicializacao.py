@@ -0,0 +1,113 @@
+# relatorio_inicializacao.py
+# Mede a partida a frio do app: num processo Python novo, importa o Streamlit e
+# executa o script uma vez (a tela de login), com -X importtime ligado. Mostra os
+# pacotes que mais pesaram na importação, o tempo até a primeira renderização e
+# quais módulos pesados foram carregados sem necessidade. Termina com erro se
+# algum orçamento for estourado, para o pipeline de deploy barrar a imagem.
+#
+# Uso: python relatorio_inicializacao.py [--orcamento-ms 4000] [--orcamento-importacao-ms 2500] [--json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent
+# Só devem ser importados nas páginas que os usam (o numpy fica de fora: o próprio
+# st.image da tela de login o importa)
+MODULOS_TARDIOS = ["pandas", "google.generativeai", "wordcloud", "matplotlib"]
+
+# Roda no processo filho; o app é executado pelo AppTest, como faria `streamlit run`
+MEDICAO = """
+import json, sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+importado = time.perf_counter()
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+app.run()
+fim = time.perf_counter()
+print(json.dumps({
+    "importacao_streamlit_ms": (importado - inicio) * 1000,
+    "execucao_script_ms": (fim - importado) * 1000,
+    "primeira_renderizacao_ms": (fim - inicio) * 1000,
+    "excecoes": [str(e.value) for e in app.exception],
+    "modulos_tardios_carregados": [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+"""
+
+def ler_importtime(saida):
+    # Linhas "import time: próprio | acumulado | módulo"; o recuo do nome indica o nível.
+    # Soma o acumulado dos imports de primeiro nível por pacote raiz.
+    pacotes = {}
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "|" not in linha:
+            continue
+        partes = linha[len("import time:"):].split("|")
+        if len(partes) != 3 or not partes[1].strip().isdigit():
+            continue
+        nome = partes[2][1:].rstrip()
+        if nome.startswith(" "):
+            continue
+        raiz = nome.split(".")[0]
+        pacotes[raiz] = pacotes.get(raiz, 0) + int(partes[1]) / 1000
+    return sorted(pacotes.items(), key=lambda p: p[1], reverse=True)
+
+def medir():
+    ambiente = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", MEDICAO,
+         str(RAIZ / "streamlit_app.py"), json.dumps(MODULOS_TARDIOS)],
+        cwd=RAIZ, env=ambiente, capture_output=True, text=True,
+    )
+    linhas = [l for l in processo.stdout.splitlines() if l.startswith("{")]
+    if processo.returncode != 0 or not linhas:
+        sys.exit(f"Falha ao executar o app:\n{processo.stderr[-3000:]}")
+    resultado = json.loads(linhas[-1])
+    resultado["importacoes_ms"] = ler_importtime(processo.stderr)
+    resultado["importacao_total_ms"] = sum(ms for _, ms in resultado["importacoes_ms"])
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de inicialização do app.")
+    parser.add_argument("--orcamento-ms", type=float, default=4000,
+                        help="limite para a primeira renderização da tela de login")
+    parser.add_argument("--orcamento-importacao-ms", type=float, default=2500,
+                        help="limite para a soma das importações")
+    parser.add_argument("--top", type=int, default=15, help="quantos pacotes listar")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args()
+
+    resultado = medir()
+    falhas = []
+    if resultado["primeira_renderizacao_ms"] > args.orcamento_ms:
+        falhas.append(f"primeira renderização em {resultado['primeira_renderizacao_ms']:.0f} ms "
+                      f"(orçamento {args.orcamento_ms:.0f} ms)")
+    if resultado["importacao_total_ms"] > args.orcamento_importacao_ms:
+        falhas.append(f"importações somam {resultado['importacao_total_ms']:.0f} ms "
+                      f"(orçamento {args.orcamento_importacao_ms:.0f} ms)")
+    if resultado["modulos_tardios_carregados"]:
+        falhas.append("módulos pesados carregados na tela de login: "
+                      + ", ".join(resultado["modulos_tardios_carregados"]))
+    if resultado["excecoes"]:
+        falhas.append("o script terminou com exceção: " + "; ".join(resultado["excecoes"]))
+    resultado["falhas"] = falhas
+
+    if args.json:
+        print(json.dumps(resultado, ensure_ascii=False, indent=2))
+    else:
+        print(f"Importação do Streamlit: {resultado['importacao_streamlit_ms']:.0f} ms")
+        print(f"Execução do script:      {resultado['execucao_script_ms']:.0f} ms")
+        print(f"Primeira renderização:   {resultado['primeira_renderizacao_ms']:.0f} ms")
+        print(f"\nImportações por pacote (total {resultado['importacao_total_ms']:.0f} ms):")
+        for pacote, ms in resultado["importacoes_ms"][:args.top]:
+            print(f"  {ms:8.1f} ms  {pacote}")
+        print()
+        for falha in falhas:
+            print(f"❌ {falha}")
+        if not falhas:
+            print("✅ Dentro do orçamento.")
+    sys.exit(1 if falhas else 0)
+
+if __name__ == "__main__":
+    main()
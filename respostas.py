@@ -0,0 +1,429 @@
+# respostas.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+from agregados import aplicar_resposta
+from instrumentacao import registrar_dataframe
+from sincronizacao import ao_invalidar, notificar, ouvinte_ativo
+from similares import atualizar_leitor
+
+# As respostas ficam em JSONB e a faixa etária vira coluna própria, para que os filtros
+# usem índices. As contagens por gênero (e pelos demais campos) vêm de agregados.py.
+# O pandas só é importado quando um DataFrame é montado (painel do escritor).
+
+# Campos do formulário, na ordem em que aparecem na página de perfil
+CAMPOS_FORMULARIO = [
+    "idade", "frequencia_leitura", "tempo_leitura", "local_leitura", "tipo_livro",
+    "generos", "genero_outro", "autor_favorito", "tamanho_livro", "narrativa",
+    "sentimento_livro", "questoes_sociais", "releitura", "formato_livro", "influencia",
+    "avaliacoes", "audiolivros", "interesse_artigos", "area_academica", "objetivo_leitura",
+    "tipo_conteudo", "nivel_leitura", "velocidade", "curiosidade", "contexto_cultural",
+    "memoria", "leitura_em_ingles",
+]
+
+# Cache do processo para carregar_dados: cada combinação de filtros guarda o DataFrame
+# e uma marca d'água de versão. A versão de cada linha é o id da transação que a
+# gravou (atribuído pelo banco, não pelo relógio do app); a marca é o xmin do snapshot
+# tirado antes da leitura, então toda transação que a leitura não viu tem id >= marca,
+# mesmo que tenha feito commit depois. Um salvar_resposta, local ou avisado por outra
+# réplica, marca só as fatias que contêm a linha alterada; depois da validade, a marca
+# é conferida no banco. Nos dois casos só as linhas com versão >= marca são buscadas
+# (as de transações ainda abertas na leitura anterior voltam e são trocadas por usuário).
+# Com o ouvinte de avisos conectado vale a validade maior. Os DataFrames são
+# compartilhados entre sessões: não os modifique.
+VALIDADE_CACHE = float(os.getenv("RESPOSTAS_CACHE_SEGUNDOS", "60"))
+VALIDADE_CACHE_SINCRONIZADO = float(os.getenv("RESPOSTAS_CACHE_SINCRONIZADO_SEGUNDOS", "900"))
+MAX_ENTRADAS_CACHE = int(os.getenv("RESPOSTAS_CACHE_ENTRADAS", "32"))
+
+# Resposta e perfil do usuário logado ficam na sessão (carregados no login). Cada
+# salvar_resposta deste processo publica a versão nova em _gravacoes, que a sessão
+# adota sem ir ao banco; gravações de outros processos chegam pelos avisos de
+# sincronizacao.py ou, sem eles, aparecem depois da validade.
+VALIDADE_RESPOSTA_SESSAO = float(os.getenv("RESPOSTA_SESSAO_SEGUNDOS", "300"))
+MAX_GRAVACOES = int(os.getenv("RESPOSTA_SESSAO_GRAVACOES", "1000"))
+
+@dataclass(frozen=True)
+class RespostaUsuario:
+    dados: dict = None
+    perfil_gerado: str = None
+    data_envio: datetime = None
+    versao: str = None
+    verificada_em: float = field(default_factory=time.monotonic)
+
+_gravacoes = OrderedDict()
+_invalidacoes = OrderedDict()  # usuario -> instante do último aviso; None = todos
+_lock_gravacoes = threading.Lock()
+
+class _CacheRespostas:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versao = 0
+        self.entradas = OrderedDict()
+        self.acertos = 0
+        self.faltas = 0
+        self.atualizacoes = 0
+        self.invalidacoes_seletivas = 0
+
+class _EntradaCache:
+    def __init__(self, df, marca, versao, pendentes=()):
+        self.df = df
+        self.marca = marca
+        self.versao = versao
+        # Usuários avisados desde a última leitura: relidos pelo nome, além da marca
+        self.pendentes = set(pendentes)
+        self.verificado_em = float("-inf") if self.pendentes else time.monotonic()
+
+_cache = _CacheRespostas()
+
+def _pd():
+    # O pandas só é carregado quando usado, para não pesar na tela de login
+    import pandas as pd
+    return pd
+
+def invalidar_cache_respostas():
+    with _cache.lock:
+        _cache.versao += 1
+
+def limpar_cache_respostas():
+    # Descarta todas as entradas (ex.: ao trocar de banco em scripts e benchmarks)
+    with _cache.lock:
+        _cache.entradas.clear()
+        _cache.versao += 1
+
+def _validade(padrao):
+    return VALIDADE_CACHE_SINCRONIZADO if ouvinte_ativo() else padrao
+
+def _contem(chave, dia, idade):
+    inicio, fim, filtro_idade = chave
+    return ((inicio is None or dia >= inicio) and (fim is None or dia <= fim)
+            and (filtro_idade is None or filtro_idade == idade))
+
+def invalidar_linhas_respostas(linhas, usuario=None):
+    # linhas: (dia, idade) das respostas que entraram ou saíram; as demais fatias seguem válidas
+    with _cache.lock:
+        for chave, entrada in _cache.entradas.items():
+            if any(_contem(chave, dia, idade) for dia, idade in linhas):
+                entrada.verificado_em = float("-inf")
+                if usuario is not None:
+                    entrada.pendentes.add(usuario)
+                _cache.invalidacoes_seletivas += 1
+
+def _ao_mudar_respostas(dados):
+    # Aviso de outra réplica: {"usuario", "linhas": [[dia, idade], ...]}; vazio = tudo
+    agora = time.monotonic()
+    if not dados:
+        invalidar_cache_respostas()
+        with _lock_gravacoes:
+            _gravacoes.clear()
+            _invalidacoes.clear()
+            _invalidacoes[None] = agora
+        return
+    invalidar_linhas_respostas([(date.fromisoformat(dia), idade) for dia, idade in dados["linhas"]],
+                               dados["usuario"])
+    with _lock_gravacoes:
+        _gravacoes.pop(dados["usuario"], None)
+        _invalidacoes[dados["usuario"]] = agora
+        _invalidacoes.move_to_end(dados["usuario"])
+        while len(_invalidacoes) > MAX_GRAVACOES:
+            _invalidacoes.popitem(last=False)
+
+ao_invalidar("respostas", _ao_mudar_respostas)
+
+def estatisticas_cache_respostas():
+    with _cache.lock:
+        return {
+            "acertos": _cache.acertos,
+            "faltas": _cache.faltas,
+            "atualizacoes_incrementais": _cache.atualizacoes,
+            "invalidacoes_seletivas": _cache.invalidacoes_seletivas,
+            "entradas": len(_cache.entradas),
+            "versao": _cache.versao,
+            "avisos_entre_replicas": ouvinte_ativo(),
+        }
+
+def _normalizar(dados):
+    return dados if isinstance(dados, dict) else json.loads(dados)
+
+def migrar_respostas_formulario(engine, tamanho_lote=1000, saida=None):
+    # Idempotente: cria o esquema novo ou converte o antigo (dados em TEXT) e
+    # preenche idade em lotes, percorrendo os usuários em ordem.
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS respostas_formulario (
+                usuario TEXT PRIMARY KEY,
+                dados JSONB,
+                perfil_gerado TEXT,
+                data_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """))
+        conn.execute(text("""
+            ALTER TABLE respostas_formulario ADD COLUMN IF NOT EXISTS idade TEXT;
+        """))
+        tipo_dados = conn.execute(text("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'respostas_formulario' AND column_name = 'dados'
+        """)).scalar()
+        if tipo_dados != "jsonb":
+            conn.execute(text("""
+                ALTER TABLE respostas_formulario ALTER COLUMN dados TYPE JSONB USING dados::jsonb;
+            """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS respostas_data_envio_idx ON respostas_formulario (data_envio);
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS respostas_idade_idx ON respostas_formulario (idade, data_envio);
+        """))
+
+    ultimo, total = "", 0
+    while True:
+        with engine.begin() as conn:
+            usuarios = conn.execute(text("""
+                SELECT usuario FROM respostas_formulario
+                WHERE usuario > :ultimo
+                ORDER BY usuario
+                LIMIT :lote
+            """), {"ultimo": ultimo, "lote": tamanho_lote}).scalars().all()
+            if not usuarios:
+                break
+            conn.execute(text("""
+                UPDATE respostas_formulario SET idade = NULLIF(dados->>'idade', '')
+                WHERE usuario = ANY(:usuarios) AND idade IS DISTINCT FROM NULLIF(dados->>'idade', '')
+            """), {"usuarios": usuarios})
+        ultimo, total = usuarios[-1], total + len(usuarios)
+        if saida:
+            saida(f"{total} respostas migradas (até '{ultimo}')")
+    return total
+
+def adicionar_versao_respostas(engine):
+    # Linhas antigas ficam com o id da transação da migração, já confirmada para todos
+    with engine.begin() as conn:
+        conn.execute(text("""
+            ALTER TABLE respostas_formulario
+            ADD COLUMN IF NOT EXISTS versao xid8 NOT NULL DEFAULT pg_current_xact_id();
+        """))
+    # Fora de transação, para não bloquear as gravações na tabela enquanto o índice é criado
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS respostas_versao_idx ON respostas_formulario (versao);
+        """))
+
+def remover_respostas_generos(engine):
+    # A tabela de gêneros nunca era lida: as contagens e filtros usam agregados_respostas
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS respostas_generos"))
+
+def marca_atual(conn):
+    # Tirada antes da leitura: transações ainda não visíveis têm id >= este valor
+    return conn.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())")).scalar()
+
+def salvar_resposta(engine, usuario, dados_dict, perfil_gerado):
+    dados = _normalizar(dados_dict)
+    with engine.begin() as conn:
+        # A resposta anterior do usuário sai das contagens do painel antes de entrar a nova
+        anterior = conn.execute(text("""
+            SELECT dados, data_envio FROM respostas_formulario
+            WHERE usuario = :usuario
+            FOR UPDATE
+        """), {"usuario": usuario}).fetchone()
+        if anterior and anterior.dados:
+            aplicar_resposta(conn, anterior.dados, anterior.data_envio, sinal=-1)
+        data_envio = datetime.now()
+        versao = conn.execute(text("""
+            INSERT INTO respostas_formulario (usuario, dados, idade, perfil_gerado, data_envio)
+            VALUES (:usuario, CAST(:dados AS JSONB), :idade, :perfil, :data_envio)
+            ON CONFLICT (usuario) DO UPDATE
+            SET dados = EXCLUDED.dados, idade = EXCLUDED.idade,
+                perfil_gerado = EXCLUDED.perfil_gerado, data_envio = EXCLUDED.data_envio,
+                versao = pg_current_xact_id()
+            RETURNING versao::text
+        """), {
+            "usuario": usuario,
+            "dados": json.dumps(dados, ensure_ascii=False),
+            "idade": dados.get("idade") or None,
+            "perfil": perfil_gerado,
+            "data_envio": data_envio
+        }).scalar()
+        aplicar_resposta(conn, dados, data_envio)
+        # Fatias afetadas: a da resposta anterior (que sai) e a da nova
+        linhas = [(data_envio.date(), dados.get("idade") or None)]
+        if anterior and anterior.dados:
+            linhas.append((anterior.data_envio.date(), _normalizar(anterior.dados).get("idade") or None))
+        notificar(conn, "respostas", usuario=usuario,
+                  linhas=[[dia.isoformat(), idade] for dia, idade in linhas])
+    invalidar_linhas_respostas(linhas, usuario)
+    atualizar_leitor(usuario, dados)
+    resposta = RespostaUsuario(dados, perfil_gerado, data_envio, versao)
+    with _lock_gravacoes:
+        _gravacoes[usuario] = resposta
+        _gravacoes.move_to_end(usuario)
+        while len(_gravacoes) > MAX_GRAVACOES:
+            _gravacoes.popitem(last=False)
+    return resposta
+
+def buscar_resposta_existente(engine, usuario):
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT dados, perfil_gerado, data_envio, versao::text AS versao FROM respostas_formulario
+            WHERE usuario = :usuario
+        """), {"usuario": usuario}).fetchone()
+
+def resposta_da_linha(linha):
+    # Linha com dados, perfil_gerado, data_envio e versao (None se o usuário ainda não respondeu)
+    if linha is None or linha.dados is None:
+        return RespostaUsuario()
+    dados = linha.dados if isinstance(linha.dados, dict) else json.loads(linha.dados)
+    return RespostaUsuario(dados, linha.perfil_gerado, linha.data_envio, linha.versao)
+
+def resposta_atual(engine, usuario, guardada=None):
+    # Resposta da sessão, trocada pela gravação mais nova deste processo; só vai ao
+    # banco se não houver nada guardado, se a validade expirou ou se chegou um aviso.
+    # Nos dois últimos casos confere primeiro só a versão da linha e relê dados e
+    # perfil apenas se ela mudou
+    with _lock_gravacoes:
+        gravada = _gravacoes.get(usuario)
+        invalidada_em = max(_invalidacoes.get(usuario, 0.0), _invalidacoes.get(None, 0.0))
+    if gravada is not None and (guardada is None or guardada.data_envio is None
+                                or gravada.data_envio > guardada.data_envio):
+        return gravada
+    if (guardada is not None and guardada.verificada_em > invalidada_em
+            and time.monotonic() - guardada.verificada_em < _validade(VALIDADE_RESPOSTA_SESSAO)):
+        return guardada
+    if guardada is not None:
+        with engine.connect() as conn:
+            versao = conn.execute(text("""
+                SELECT versao::text FROM respostas_formulario WHERE usuario = :usuario
+            """), {"usuario": usuario}).scalar()
+        if versao == guardada.versao:
+            return replace(guardada, verificada_em=time.monotonic())
+    return resposta_da_linha(buscar_resposta_existente(engine, usuario))
+
+def filtros_sql(inicio=None, fim=None, idade=None, desde=None, usuarios=None):
+    # Os filtros do painel viram WHERE sobre colunas indexadas (data_envio, idade)
+    condicoes, parametros = [], {}
+    if inicio is not None:
+        condicoes.append("data_envio >= :inicio")
+        parametros["inicio"] = inicio
+    if fim is not None:
+        condicoes.append("data_envio < :fim")
+        parametros["fim"] = fim + timedelta(days=1)
+    if idade is not None:
+        condicoes.append("idade = :idade")
+        parametros["idade"] = idade
+    if desde is not None and usuarios:
+        condicoes.append("(versao >= CAST(:desde AS xid8) OR usuario = ANY(:usuarios))")
+        parametros.update(desde=desde, usuarios=list(usuarios))
+    elif desde is not None:
+        condicoes.append("versao >= CAST(:desde AS xid8)")
+        parametros["desde"] = desde
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return where, parametros
+
+def _expandir(linhas, colunas):
+    pd = _pd()
+    df = pd.DataFrame(linhas, columns=colunas)
+    if df.empty:
+        return df.drop(columns=["dados"])
+    dados = pd.DataFrame.from_records([d or {} for d in df["dados"]], index=df.index)
+    df = pd.concat([df.drop(columns=["dados"]), dados], axis=1)
+    df["data_envio"] = pd.to_datetime(df["data_envio"])
+    return df
+
+def _consultar_respostas(engine, inicio=None, fim=None, idade=None, desde=None, usuarios=None):
+    where, parametros = filtros_sql(inicio, fim, idade, desde, usuarios)
+    with engine.connect() as conn:
+        # A marca vale para a tabela inteira, não só para a fatia
+        marca = marca_atual(conn)
+        linhas = conn.execute(text(f"""
+            SELECT usuario, dados, perfil_gerado, data_envio FROM respostas_formulario {where}
+        """), parametros).fetchall()
+
+    return _expandir(linhas, ["usuario", "dados", "perfil_gerado", "data_envio"]), marca
+
+def _atualizar_entrada(engine, entrada, inicio, fim, idade, pendentes):
+    # Busca só o que mudou desde a marca d'água (e os usuários avisados), sem os
+    # filtros, para saber quem reenviou o formulário, e troca as linhas desses
+    # usuários na fatia em cache
+    novas, marca = _consultar_respostas(engine, desde=entrada.marca, usuarios=pendentes)
+    if novas.empty:
+        return entrada.df, marca
+    base = entrada.df[~entrada.df["usuario"].isin(novas["usuario"])]
+    if inicio is not None:
+        novas = novas[novas["data_envio"].dt.date >= inicio]
+    if fim is not None:
+        novas = novas[novas["data_envio"].dt.date <= fim]
+    if idade is not None:
+        novas = novas[novas["idade"] == idade]
+    pd = _pd()
+    return pd.concat([base, novas], ignore_index=True), marca
+
+def carregar_dados(engine, inicio=None, fim=None, idade=None):
+    chave = (inicio, fim, idade)
+    with _cache.lock:
+        entrada = _cache.entradas.get(chave)
+        versao = _cache.versao
+        pendentes = set(entrada.pendentes) if entrada is not None else set()
+        if entrada is not None:
+            _cache.entradas.move_to_end(chave)
+            if entrada.versao == versao and time.monotonic() - entrada.verificado_em < _validade(VALIDADE_CACHE):
+                _cache.acertos += 1
+                return entrada.df
+
+    # Erros de banco sobem para quem chamou: no worker, a tarefa registra o erro
+    # em vez de seguir com um recorte vazio
+    if entrada is None:
+        df, marca = _consultar_respostas(engine, inicio, fim, idade)
+    else:
+        df, marca = _atualizar_entrada(engine, entrada, inicio, fim, idade, pendentes)
+    registrar_dataframe("carregar_dados", df)
+
+    with _cache.lock:
+        if entrada is None:
+            _cache.faltas += 1
+        else:
+            _cache.atualizacoes += 1
+        # Avisos que chegaram durante a leitura continuam pendentes na entrada nova
+        atual = _cache.entradas.get(chave)
+        _cache.entradas[chave] = _EntradaCache(df, marca, versao,
+                                               atual.pendentes - pendentes if atual is not None else ())
+        _cache.entradas.move_to_end(chave)
+        while len(_cache.entradas) > MAX_ENTRADAS_CACHE:
+            _cache.entradas.popitem(last=False)
+    return df
+
+def assinatura_fatia(engine, inicio=None, fim=None, idade=None):
+    # (perfis, assinatura) da fatia calculados no banco, sem trazer as linhas nem ler
+    # os perfis: a contagem muda quando um perfil entra ou sai e a maior versão
+    # quando algum é gravado ou regerado
+    where, parametros = filtros_sql(inicio, fim, idade)
+    with engine.connect() as conn:
+        total, versao = conn.execute(text(f"""
+            SELECT COUNT(*) FILTER (WHERE perfil_gerado IS NOT NULL), MAX(versao)::text
+            FROM respostas_formulario {where}
+        """), parametros).fetchone()
+    return total, f"{total}@{versao}"
+
+def pagina_respostas(engine, inicio=None, fim=None, idade=None, pagina=1, por_pagina=50):
+    # Uma página das respostas filtradas, mais recentes primeiro, e o total da fatia
+    where, parametros = filtros_sql(inicio, fim, idade)
+    parametros.update(limite=por_pagina, deslocamento=(pagina - 1) * por_pagina)
+    with engine.connect() as conn:
+        linhas = conn.execute(text(f"""
+            SELECT usuario, dados, data_envio, COUNT(*) OVER () AS total
+            FROM respostas_formulario {where}
+            ORDER BY data_envio DESC, usuario
+            LIMIT :limite OFFSET :deslocamento
+        """), parametros).fetchall()
+        if linhas:
+            total = linhas[0].total
+        elif pagina > 1:
+            # Página além do fim: a janela não traz o total, que é contado à parte
+            total = conn.execute(text(f"SELECT COUNT(*) FROM respostas_formulario {where}"), parametros).scalar()
+        else:
+            total = 0
+    df = _expandir([l[:3] for l in linhas], ["usuario", "dados", "data_envio"])
+    return df, total
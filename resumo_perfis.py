@@ -0,0 +1,106 @@
+# resumo_perfis.py
+import hashlib
+import json
+import os
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from cache_llm import buscar_no_cache, guardar_no_cache
+from llm import MODELO_PADRAO
+from prompts import estimar_tokens
+
+# Resumo hierárquico (map-reduce) dos perfis usados no prompt do Painel do Escritor.
+# Os perfis são agrupados em lotes com orçamento de tokens, cada lote é resumido em
+# paralelo e os resumos são combinados até caberem no orçamento. Cada resumo fica no
+# cache_llm, identificado pelas linhas que cobre: um leitor novo só refaz o último lote.
+ORCAMENTO_TOKENS = int(os.getenv("RESUMO_ORCAMENTO_TOKENS", "12000"))
+PERFIS_POR_LOTE = int(os.getenv("RESUMO_PERFIS_POR_LOTE", "20"))
+MAX_PARALELO = int(os.getenv("RESUMO_MAX_PARALELO", "4"))
+
+# A análise final é compartilhada entre visitantes por este tempo, enquanto a
+# seleção de perfis do recorte não mudar
+TTL_ANALISE = timedelta(hours=float(os.getenv("ANALISE_CACHE_TTL_HORAS", "24")))
+
+PROMPT_RESUMO = """
+Você recebe perfis literários de leitores brasileiros gerados pela plataforma LitMe.
+Resuma, em tópicos curtos, os padrões que aparecem nesses perfis: formatos de leitura,
+gêneros citados, objetivos ao ler, sentimentos buscados, faixa etária, frequência de leitura,
+estilos narrativos e tamanho de livro preferidos. Quando possível, diga quantos leitores
+compartilham cada padrão. Não invente informações que não estejam nos perfis.
+
+Perfis:
+{textos}
+""".strip()
+
+PROMPT_COMBINAR = """
+Os textos abaixo são resumos parciais de perfis de leitores brasileiros.
+Combine-os em um único resumo em tópicos, somando as contagens de leitores de padrões
+repetidos e preservando os padrões menos frequentes que sejam relevantes para escritores.
+
+Resumos parciais:
+{textos}
+""".strip()
+
+def perfis_para_resumo(df):
+    # Lista ordenada de (id, texto); o id muda quando o leitor reenvia o formulário
+    if df.empty or "perfil_gerado" not in df.columns:
+        return []
+    df = df.dropna(subset=["perfil_gerado"]).sort_values(["data_envio", "usuario"])
+    return [
+        (f"{usuario}@{data_envio.isoformat()}", perfil.lower().strip())
+        for usuario, data_envio, perfil in zip(df["usuario"], df["data_envio"], df["perfil_gerado"])
+        if perfil.strip()
+    ]
+
+def assinatura_perfis(perfis):
+    return hashlib.sha256("|".join(i for i, _ in perfis).encode("utf-8")).hexdigest()
+
+def chave_analise(parametros, assinatura):
+    # Mesmo recorte (filtros) com a mesma versão dos dados -> mesma chave; a assinatura
+    # vem de respostas.assinatura_fatia, calculada no banco
+    conteudo = json.dumps({**parametros, "perfis": assinatura}, sort_keys=True)
+    return hashlib.sha256(f"analise:{MODELO_PADRAO}:{conteudo}".encode("utf-8")).hexdigest()
+
+def _fronteira(item_id, perfis_por_lote):
+    # Fronteira definida pelo próprio item, não pela posição: inserir ou remover
+    # um perfil só altera o lote em que ele está
+    return int(hashlib.sha256(item_id.encode("utf-8")).hexdigest()[:8], 16) % perfis_por_lote == 0
+
+def dividir_em_lotes(itens, orcamento=ORCAMENTO_TOKENS, perfis_por_lote=PERFIS_POR_LOTE):
+    lotes, atual, tokens = [], [], 0
+    for item_id, texto in itens:
+        custo = estimar_tokens(texto)
+        if atual and tokens + custo > orcamento:
+            lotes.append(atual)
+            atual, tokens = [], 0
+        atual.append((item_id, texto))
+        tokens += custo
+        if _fronteira(item_id, perfis_por_lote):
+            lotes.append(atual)
+            atual, tokens = [], 0
+    if atual:
+        lotes.append(atual)
+    return lotes
+
+def _resumir_lote(engine, lote, nivel, gerar, modelo):
+    lote_id = assinatura_perfis(lote)
+    chave = hashlib.sha256(f"resumo:{modelo}:{nivel}:{lote_id}".encode("utf-8")).hexdigest()
+    resumo = buscar_no_cache(engine, chave)
+    if resumo is None:
+        modelo_prompt = PROMPT_RESUMO if nivel == 0 else PROMPT_COMBINAR
+        resumo = gerar(modelo_prompt.format(textos="\n\n".join(texto for _, texto in lote)))
+        guardar_no_cache(engine, chave, modelo, resumo)
+    return lote_id, resumo
+
+def resumir_perfis(engine, perfis, gerar, orcamento=ORCAMENTO_TOKENS, modelo=MODELO_PADRAO):
+    # Devolve o texto que vai no prompt final: os próprios perfis, se couberem,
+    # ou os resumos do nível em que o total ficou dentro do orçamento
+    itens, nivel = list(perfis), 0
+    while len(itens) > 1 and sum(estimar_tokens(t) for _, t in itens) > orcamento:
+        lotes = dividir_em_lotes(itens, orcamento)
+        with ThreadPoolExecutor(max_workers=MAX_PARALELO, thread_name_prefix="litme-resumo") as pool:
+            resumidos = list(pool.map(lambda lote: _resumir_lote(engine, lote, nivel, gerar, modelo), lotes))
+        if len(resumidos) >= len(itens) and nivel > 0:
+            itens = resumidos
+            break
+        itens, nivel = resumidos, nivel + 1
+    return " ".join(texto for _, texto in itens) if nivel == 0 else "\n\n".join(texto for _, texto in itens)
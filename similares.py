@@ -0,0 +1,267 @@
+# similares.py
+import os
+import threading
+import time
+import unicodedata
+import streamlit as st
+from sqlalchemy import text
+from instrumentacao import medir, registrar
+from sincronizacao import ao_invalidar, ouvinte_ativo
+
+# "Leitores parecidos com você" sem passar pelo modelo. Cada resposta do formulário
+# vira um vetor one-hot (campo=valor) normalizado, e a similaridade de cosseno com
+# todos os leitores sai de uma só operação NumPy. Cada campo pesa 1 no total (os
+# gêneros dividem o peso entre si). Autores e gêneros digitados criam colunas novas
+# a cada leitor, então o vetor é guardado esparso: cada linha tem no máximo `largura`
+# pares (coluna, peso), e a memória cresce com o número de leitores, não com o de
+# colunas. salvar_resposta troca só a linha do usuário; gravações de outras réplicas
+# chegam pelos avisos de sincronizacao.py ou, sem eles, pela marca de versão de
+# respostas.py depois da validade. O numpy só é importado quando o índice é montado.
+K_PADRAO = int(os.getenv("SIMILARES_K", "20"))
+VALIDADE_INDICE = float(os.getenv("SIMILARES_VALIDADE_SEGUNDOS", "60"))
+VALIDADE_INDICE_SINCRONIZADO = float(os.getenv("SIMILARES_VALIDADE_SINCRONIZADO_SEGUNDOS", "900"))
+LARGURA_INICIAL = 40  # pares por linha; cresce se alguma resposta tiver mais características
+
+# Campos de múltipla escolha, codificados como estão
+CAMPOS_CATEGORICOS = [
+    "idade", "frequencia_leitura", "tempo_leitura", "local_leitura", "tipo_livro",
+    "tamanho_livro", "narrativa", "sentimento_livro", "questoes_sociais", "releitura",
+    "formato_livro", "influencia", "avaliacoes", "audiolivros", "interesse_artigos",
+    "objetivo_leitura", "tipo_conteudo", "nivel_leitura", "velocidade", "curiosidade",
+    "contexto_cultural", "memoria", "leitura_em_ingles",
+]
+
+def _chave_texto(valor):
+    # Texto livre comparável: sem acento, caixa ou espaços repetidos
+    valor = unicodedata.normalize("NFKD", valor or "").encode("ascii", "ignore").decode()
+    return " ".join(valor.casefold().split())
+
+def _generos(dados):
+    generos = [g for g in (dados.get("generos") or "").split(", ") if g and g != "Outro"]
+    outro = (dados.get("genero_outro") or "").strip()
+    if outro and _chave_texto(outro) not in {_chave_texto(g) for g in generos}:
+        generos.append(outro)
+    return generos
+
+def _caracteristicas(dados):
+    # (campo, valor) -> peso; a soma dos quadrados de cada campo é 1
+    pesos = {(campo, dados[campo]): 1.0 for campo in CAMPOS_CATEGORICOS if dados.get(campo)}
+    generos = {_chave_texto(g) for g in _generos(dados)}
+    for genero in generos:
+        pesos[("generos", genero)] = len(generos) ** -0.5
+    autor = _chave_texto(dados.get("autor_favorito"))
+    if autor:
+        pesos[("autor_favorito", autor)] = 1.0
+    return pesos
+
+class _Indice:
+    def __init__(self, np):
+        self.np = np
+        self.colunas = {}    # (campo, valor) -> coluna; a coluna 0 é o preenchimento
+        self.linhas = {}     # usuario -> linha
+        self.usuarios = []   # linha -> usuario
+        self.preferencias = []  # linha -> (autor, generos) para montar as sugestões
+        self.indices = np.zeros((64, LARGURA_INICIAL), dtype=np.int32)
+        self.pesos = np.zeros((64, LARGURA_INICIAL), dtype=np.float32)
+        self.marca = None
+        self.verificado_em = time.monotonic()
+
+    def _crescer(self, linhas, largura):
+        for nome in ("indices", "pesos"):
+            atual = getattr(self, nome)
+            maior = self.np.zeros((linhas, largura), dtype=atual.dtype)
+            maior[:atual.shape[0], :atual.shape[1]] = atual
+            setattr(self, nome, maior)
+
+    def gravar(self, usuario, dados):
+        linha = self.linhas.get(usuario)
+        if linha is None:
+            linha = self.linhas[usuario] = len(self.usuarios)
+            self.usuarios.append(usuario)
+            self.preferencias.append(None)
+        pesos = _caracteristicas(dados)
+        if linha >= self.indices.shape[0] or len(pesos) > self.indices.shape[1]:
+            self._crescer(max(self.indices.shape[0], 2 * linha), max(self.indices.shape[1], len(pesos)))
+        colunas = [self.colunas.setdefault(c, len(self.colunas) + 1) for c in pesos]
+        valores = self.np.fromiter(pesos.values(), dtype=self.np.float32, count=len(pesos))
+        self.indices[linha] = 0
+        self.pesos[linha] = 0
+        if colunas:
+            self.indices[linha, :len(colunas)] = colunas
+            self.pesos[linha, :len(colunas)] = valores / self.np.linalg.norm(valores)
+        self.preferencias[linha] = ((dados.get("autor_favorito") or "").strip(), _generos(dados))
+
+    def vetor(self, dados):
+        # Características que nenhum leitor tem não somam no produto, mas contam na norma
+        pesos = _caracteristicas(dados)
+        vetor = self.np.zeros(len(self.colunas) + 1, dtype=self.np.float32)
+        if not pesos:
+            return vetor
+        norma = sum(p * p for p in pesos.values()) ** 0.5
+        for caracteristica, peso in pesos.items():
+            coluna = self.colunas.get(caracteristica)
+            if coluna is not None:
+                vetor[coluna] = peso / norma
+        return vetor
+
+    def parecidos(self, dados, usuario=None, k=K_PADRAO):
+        np = self.np
+        total = len(self.usuarios)
+        if not total:
+            return []
+        # Produto esparso: o peso da consulta em cada coluna da linha, vezes o da linha
+        similaridades = (self.vetor(dados)[self.indices[:total]] * self.pesos[:total]).sum(axis=1)
+        if usuario in self.linhas:
+            similaridades[self.linhas[usuario]] = -1
+        k = min(k, total)
+        melhores = np.argpartition(-similaridades, k - 1)[:k]
+        melhores = melhores[np.argsort(-similaridades[melhores], kind="stable")]
+        return [(self.usuarios[i], float(similaridades[i]), self.preferencias[i])
+                for i in melhores if similaridades[i] > 0]
+
+_indice = None
+_pendentes = set()  # usuários alterados em outras réplicas, relidos na próxima consulta
+_reconstruir = False
+_lock = threading.Lock()
+_lock_carga = threading.Lock()
+
+def _em_uso():
+    # Com o índice montado ou em montagem; antes disso não há o que atualizar
+    return _indice is not None or _lock_carga.locked()
+
+def _ao_mudar_respostas(dados):
+    # Mesmo aviso de respostas.py: {"usuario", "linhas"}; vazio = tudo
+    global _reconstruir
+    with _lock:
+        if not dados:
+            _reconstruir = True
+        elif _em_uso():
+            _pendentes.add(dados["usuario"])
+
+ao_invalidar("respostas", _ao_mudar_respostas)
+
+def atualizar_leitor(usuario, dados):
+    # Chamado por salvar_resposta depois do commit. Durante uma montagem a leitura
+    # pode ter começado antes do commit: o usuário é relido na próxima consulta.
+    with _lock:
+        if _indice is not None:
+            _indice.gravar(usuario, dados)
+            _pendentes.discard(usuario)
+        elif _em_uso():
+            _pendentes.add(usuario)
+
+def limpar_indice_similares():
+    global _indice
+    with _lock:
+        _indice = None
+
+def _ler_respostas(engine, usuarios=None, desde=None):
+    # Devolve (linhas, marca); a marca é a mesma de respostas.marca_atual, tirada antes
+    # da leitura, e na próxima vez volta tudo com versao >= marca
+    condicoes = ["dados IS NOT NULL"]
+    if desde is not None:
+        condicoes.append("(usuario = ANY(:usuarios) OR versao >= CAST(:desde AS xid8))")
+    with engine.connect() as conn:
+        marca = conn.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())")).scalar()
+        linhas = conn.execute(text(f"""
+            SELECT usuario, dados FROM respostas_formulario
+            WHERE {' AND '.join(condicoes)}
+        """), {"usuarios": list(usuarios or []), "desde": desde}).fetchall()
+    return linhas, marca
+
+def _montar(engine):
+    import numpy as np
+    with medir("similares_ms", operacao="montar"):
+        indice = _Indice(np)
+        linhas, indice.marca = _ler_respostas(engine)
+        for linha in linhas:
+            indice.gravar(linha.usuario, linha.dados)
+    registrar("similares_leitores", len(linhas))
+    return indice
+
+def _indice_atual(engine):
+    # Monta na primeira consulta (ou depois de um "tudo") e relê só o que mudou
+    global _indice, _reconstruir
+    with _lock_carga:
+        with _lock:
+            indice, reconstruir = _indice, _reconstruir
+            pendentes = set(_pendentes)
+            validade = VALIDADE_INDICE_SINCRONIZADO if ouvinte_ativo() else VALIDADE_INDICE
+            expirado = indice is not None and time.monotonic() - indice.verificado_em >= validade
+        if indice is None or reconstruir:
+            indice = _montar(engine)
+            with _lock:
+                _indice, _reconstruir = indice, False
+                _pendentes.difference_update(pendentes)
+        elif pendentes or expirado:
+            with medir("similares_ms", operacao="atualizar"):
+                linhas, marca = _ler_respostas(engine, pendentes, indice.marca)
+            with _lock:
+                for linha in linhas:
+                    indice.gravar(linha.usuario, linha.dados)
+                indice.marca = marca
+                indice.verificado_em = time.monotonic()
+                _pendentes.difference_update(pendentes)
+        return indice
+
+def leitores_parecidos(engine, dados, usuario=None, k=K_PADRAO):
+    # [(usuario, similaridade, (autor, generos))] dos k leitores mais parecidos com `dados`
+    indice = _indice_atual(engine)
+    with medir("similares_ms", operacao="consultar"), _lock:
+        return indice.parecidos(dados, usuario, k)
+
+def recomendacoes_locais(engine, dados, usuario=None, k=K_PADRAO, limite=5):
+    # Autores e gêneros favoritos dos vizinhos, ponderados pela similaridade,
+    # sem os que o próprio leitor já citou
+    vizinhos = leitores_parecidos(engine, dados, usuario, k)
+    proprios = {_chave_texto(g) for g in _generos(dados)} | {_chave_texto(dados.get("autor_favorito"))}
+    autores, generos = {}, {}
+    for _, similaridade, (autor, generos_vizinho) in vizinhos:
+        for nome, destino in [(autor, autores)] + [(g, generos) for g in generos_vizinho]:
+            chave = _chave_texto(nome)
+            if not chave or chave in proprios:
+                continue
+            atual = destino.setdefault(chave, [nome, 0.0])
+            atual[1] += similaridade
+    ordenar = lambda contagem: [(nome, peso) for nome, peso in
+                                sorted(contagem.values(), key=lambda p: (-p[1], p[0]))[:limite]]
+    return {
+        "leitores": len(vizinhos),
+        "afinidade_media": sum(s for _, s, _ in vizinhos) / len(vizinhos) if vizinhos else 0.0,
+        "autores": ordenar(autores),
+        "generos": ordenar(generos),
+    }
+
+def mostrar_leitores_parecidos(engine, dados, usuario=None):
+    # Página de perfil: sai na hora, antes (ou no lugar) do perfil gerado pelo modelo
+    try:
+        sugestoes = recomendacoes_locais(engine, dados, usuario)
+    except Exception as e:
+        st.warning(f"Não foi possível buscar leitores parecidos: {e}")
+        return
+    st.subheader("👥 Leitores parecidos com você")
+    if not sugestoes["leitores"]:
+        st.info("Ainda não há leitores com respostas parecidas com as suas.")
+        return
+    st.caption(f"Com base em {sugestoes['leitores']} leitores com respostas parecidas "
+               f"(afinidade média de {sugestoes['afinidade_media']:.0%}).")
+    col_autores, col_generos = st.columns(2)
+    with col_autores:
+        st.markdown("**Autores favoritos deles**")
+        st.markdown("\n".join(f"- {nome}" for nome, _ in sugestoes["autores"]) or "_Nenhum autor novo._")
+    with col_generos:
+        st.markdown("**Gêneros que eles também leem**")
+        st.markdown("\n".join(f"- {nome}" for nome, _ in sugestoes["generos"]) or "_Nenhum gênero novo._")
+
+def estatisticas_similares():
+    with _lock:
+        if _indice is None:
+            return {"montado": False, "pendentes": len(_pendentes)}
+        return {
+            "montado": True,
+            "leitores": len(_indice.usuarios),
+            "caracteristicas": len(_indice.colunas),
+            "memoria_mb": round((_indice.indices.nbytes + _indice.pesos.nbytes) / 2 ** 20, 2),
+            "pendentes": len(_pendentes),
+            "marca": _indice.marca,
+        }
@@ -0,0 +1,108 @@
+# sincronizacao.py
+import json
+import os
+import select
+import threading
+import time
+import uuid
+from sqlalchemy import text
+from instrumentacao import registrar
+
+# Coerência dos caches entre réplicas. Quem grava chama notificar() dentro da própria
+# transação: o Postgres só entrega o NOTIFY no commit. Cada processo mantém uma thread
+# com uma conexão em LISTEN e repassa os avisos das outras réplicas aos módulos
+# inscritos com ao_invalidar(), que descartam só as chaves afetadas. Se a conexão
+# cair, os avisos perdidos viram um evento "tudo" depois de reconectar. Sem avisos
+# por INTERVALO_PING segundos, um SELECT 1 confirma que a conexão está viva (com o
+# keepalive TCP de banco.py, uma conexão meio aberta falha em vez de travar).
+CANAL = os.getenv("SINCRONIZACAO_CANAL", "litme_invalidacao")
+ATIVA = os.getenv("SINCRONIZACAO_ATIVA", "1") not in ("0", "false", "False", "")
+ESPERA_RECONEXAO = float(os.getenv("SINCRONIZACAO_RECONEXAO_SEGUNDOS", "5"))
+INTERVALO_PING = float(os.getenv("SINCRONIZACAO_PING_SEGUNDOS", "30"))
+
+ID_PROCESSO = uuid.uuid4().hex
+TUDO = "tudo"
+
+_inscritos = {}
+_lock = threading.Lock()
+_ouvinte = None
+_conectado = threading.Event()
+
+def ao_invalidar(conjunto, funcao):
+    # funcao(dados) recebe o dicionário publicado; no evento "tudo", dados = {}
+    with _lock:
+        _inscritos.setdefault(conjunto, []).append(funcao)
+
+def notificar(conn, conjunto, **dados):
+    conn.execute(text("SELECT pg_notify(:canal, :mensagem)"), {
+        "canal": CANAL,
+        "mensagem": json.dumps({"origem": ID_PROCESSO, "conjunto": conjunto, "dados": dados},
+                               ensure_ascii=False, default=str),
+    })
+
+def ouvinte_ativo():
+    # Enquanto o LISTEN está de pé, os caches podem confiar nos avisos e durar mais
+    return _conectado.is_set()
+
+def _despachar(conjunto, dados):
+    with _lock:
+        funcoes = list(_inscritos.get(conjunto, [])) if conjunto != TUDO else \
+            [f for lista in _inscritos.values() for f in lista]
+    for funcao in funcoes:
+        try:
+            funcao(dados)
+        except Exception as e:
+            print(f"Erro ao invalidar o cache ({conjunto}): {e}")
+    registrar("invalidacoes_recebidas", 1, conjunto=conjunto)
+
+def _receber(mensagem):
+    try:
+        aviso = json.loads(mensagem)
+    except ValueError:
+        return
+    # As gravações do próprio processo já invalidaram o cache local na hora
+    if aviso.get("origem") != ID_PROCESSO:
+        _despachar(aviso.get("conjunto"), aviso.get("dados") or {})
+
+def _escutar(engine):
+    primeira = True
+    while True:
+        dbapi = None
+        try:
+            # Conexão dedicada: sai do pool para não ocupar uma vaga das sessões
+            conexao = engine.raw_connection()
+            conexao.detach()
+            dbapi = conexao.dbapi_connection
+            dbapi.autocommit = True
+            with dbapi.cursor() as cursor:
+                cursor.execute(f'LISTEN "{CANAL}"')
+            _conectado.set()
+            if not primeira:
+                _despachar(TUDO, {})
+            primeira = False
+            while True:
+                if select.select([dbapi], [], [], INTERVALO_PING) == ([], [], []):
+                    with dbapi.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                else:
+                    dbapi.poll()
+                while dbapi.notifies:
+                    _receber(dbapi.notifies.pop(0).payload)
+        except Exception as e:
+            _conectado.clear()
+            print(f"Ouvinte de invalidação desconectado: {e}")
+            time.sleep(ESPERA_RECONEXAO)
+        finally:
+            if dbapi is not None and not dbapi.closed:
+                dbapi.close()
+
+def iniciar_ouvinte(engine):
+    # Uma thread por processo; só para Postgres com psycopg2
+    global _ouvinte
+    if not ATIVA or engine.dialect.driver != "psycopg2":
+        return
+    with _lock:
+        if _ouvinte is not None:
+            return
+        _ouvinte = threading.Thread(target=_escutar, args=(engine,), name="ouvinte-invalidacao", daemon=True)
+        _ouvinte.start()
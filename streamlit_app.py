@@ -1,26 +1,48 @@
 import streamlit as st
-import pandas as pd
 import hashlib
 import os
-import json
 from dotenv import load_dotenv
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import create_engine, text
-import google.generativeai as genai
+from sqlalchemy import text
 from pathlib import Path
-from wordcloud import WordCloud
-from datetime import datetime
+from datetime import date
+from banco import obter_engine, metricas_pool
+from instrumentacao import iniciar_execucao, finalizar_execucao, resumo, ultimas_execucoes, texto_prometheus
+from migracoes import migrar_uma_vez
+from sincronizacao import iniciar_ouvinte
 from gamificacao import (
     registrar_leitura,
-    mostrar_status,
-    verificar_conquistas,
+    carregar_painel_gamificacao,
     mostrar_conquistas,
-    ranking_top,
-    desafio_ativo,
-    validar_desafio,
-    calcular_pontos_e_nivel # Importar a função para usar diretamente
+    mostrar_ranking,
+    desafio_ativo
+)
+from importacao_leituras import mostrar_importacao
+from similares import mostrar_leitores_parecidos, estatisticas_similares
+from agregados import opcoes_de_filtro, contagens_respostas
+from respostas import (
+    salvar_resposta,
+    resposta_atual,
+    resposta_da_linha,
+    carregar_dados,
+    pagina_respostas,
+    assinatura_fatia,
+    estatisticas_cache_respostas
+)
+from exportacao import FORMATOS, gravar_exportacao
+from cache_llm import buscar_no_cache, guardar_no_cache, gerar_com_cache_stream
+from llm import MODELO_PADRAO, gerar_texto, gerar_stream, usando_modelo_falso
+from prompts import montar_prompt_perfil, montar_prompt_escritor, amostra_estratificada
+from resumo_perfis import TTL_ANALISE, perfis_para_resumo, chave_analise, resumir_perfis
+from tarefas import (
+    registrar_tipo,
+    enfileirar,
+    acompanhar_saida,
+    consultar_tarefa,
+    buscar_tarefa_ativa,
+    buscar_tarefa_por_chave,
+    retomar_tarefas_interrompidas
 )
-from datetime import datetime
 # Configuração da página
 st.set_page_config(page_title="Plataforma LitMe", layout="wide")
 
@@ -143,25 +165,18 @@ gemini_api_key = os.getenv("GEMINI_API_KEY")
 
 if DATABASE_URL is None:
     raise ValueError("A variável DATABASE_URL não foi encontrada.")
-if gemini_api_key is None:
+if gemini_api_key is None and not usando_modelo_falso():
     raise ValueError("A variável GEMINI_API_KEY não foi encontrada.")
 
-engine = create_engine(DATABASE_URL, connect_args={"connect_timeout": 10})
+engine = obter_engine(DATABASE_URL)
+# Avisos de gravação das outras réplicas mantêm os caches deste processo em dia
+iniciar_ouvinte(engine)
+ADMIN_USERS = {u.strip() for u in os.getenv("ADMIN_USERS", "").split(",") if u.strip()}
 
 # Funções auxiliares
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def verificar_ou_criar_tabela_usuarios():
-    with engine.begin() as conn:
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS usuarios (
-                username TEXT PRIMARY KEY,
-                nome TEXT,
-                senha_hash TEXT
-            );
-        """))
-
 def cadastrar_usuario(username, nome, senha):
     senha_hash = hash_password(senha)
     with engine.begin() as conn:
@@ -169,59 +184,129 @@ def cadastrar_usuario(username, nome, senha):
             INSERT INTO usuarios (username, nome, senha_hash)
             VALUES (:username, :nome, :senha_hash)
         """), {"username": username, "nome": nome, "senha_hash": senha_hash})
+        conn.execute(text("""
+            INSERT INTO placar (username) VALUES (:username)
+            ON CONFLICT (username) DO NOTHING
+        """), {"username": username})
 
 def autenticar_usuario(username, senha):
+    # Já traz a resposta do formulário, que fica na sessão enquanto o usuário navega
     senha_hash = hash_password(senha)
     with engine.connect() as conn:
         return conn.execute(text("""
-            SELECT username, nome FROM usuarios
-            WHERE username = :username AND senha_hash = :senha_hash
+            SELECT u.username, u.nome, r.dados, r.perfil_gerado, r.data_envio, r.versao::text AS versao
+            FROM usuarios u
+            LEFT JOIN respostas_formulario r ON r.usuario = u.username
+            WHERE u.username = :username AND u.senha_hash = :senha_hash
         """), {"username": username, "senha_hash": senha_hash}).fetchone()
 
+def resposta_da_sessao():
+    st.session_state.resposta_usuario = resposta_atual(
+        engine, st.session_state.logged_user, st.session_state.get("resposta_usuario")
+    )
+    return st.session_state.resposta_usuario
+
+
+def gerar_perfil_stream(dados, forcar_novo=False):
+    # Formulários idênticos geram prompts idênticos: reaproveita a resposta guardada
+    return gerar_com_cache_stream(engine, MODELO_PADRAO, montar_prompt_perfil(dados), gerar_stream, forcar_novo=forcar_novo)
+
+# Tarefas em segundo plano: rodam no pool do processo, fora da thread do script
+def tarefa_perfil_leitor(parametros):
+    partes = []
+    for parte in gerar_perfil_stream(parametros["dados"], forcar_novo=parametros.get("forcar_novo", False)):
+        partes.append(parte)
+        yield parte
+    salvar_resposta(engine, parametros["usuario"], parametros["dados"], "".join(partes))
+
+def tarefa_analise_escritor(parametros):
+    # Os perfis são lidos e resumidos aqui, no worker: o prompt final leva os
+    # resumos por lote em vez de todos os perfis concatenados
+    inicio, fim = (date.fromisoformat(parametros[c]) if parametros[c] else None for c in ("inicio", "fim"))
+    df = carregar_dados(engine, inicio, fim, parametros["idade"])
+    # Populações grandes entram por uma amostra estratificada, o que limita o número de lotes
+    perfis = perfis_para_resumo(amostra_estratificada(df))
+    if not perfis:
+        raise ValueError("não há perfis gerados neste recorte para analisar")
+    total_leitores = int(df["perfil_gerado"].notna().sum()) if "perfil_gerado" in df.columns else 0
+    textos = resumir_perfis(engine, perfis, gerar_texto)
+    prompt = montar_prompt_escritor(textos, parametros["faixa_info"],
+                                    total_leitores=total_leitores, amostra=len(perfis))
+    partes = []
+    for parte in gerar_stream(prompt):
+        partes.append(parte)
+        yield parte
+    guardar_no_cache(engine, parametros["chave"], MODELO_PADRAO, "".join(partes))
+
+registrar_tipo("perfil_leitor", tarefa_perfil_leitor)
+registrar_tipo("analise_escritor", tarefa_analise_escritor)
+
+def acompanhar_tarefa_perfil():
+    # Se a tarefa roda neste processo, o texto aparece conforme os tokens chegam
+    saida = acompanhar_saida(st.session_state.tarefa_perfil)
+    if saida is None:
+        aguardar_tarefa_perfil()
+        return
+    st.info("✍️ Gerando seu perfil literário...")
+    st.write_stream(saida)
+    tarefa = consultar_tarefa(engine, st.session_state.tarefa_perfil)
+    if tarefa is not None and tarefa.status in ("pendente", "executando"):
+        # A saída parou de chegar ou a tarefa roda em outro processo: segue pelo banco
+        aguardar_tarefa_perfil()
+        return
+    concluir_tarefa_perfil(tarefa)
+
+@st.fragment(run_every=2)
+def aguardar_tarefa_perfil():
+    # Tarefa em outro processo: acompanha pelo texto parcial gravado no banco
+    tarefa = consultar_tarefa(engine, st.session_state.tarefa_perfil)
+    if tarefa is not None and tarefa.status in ("pendente", "executando"):
+        st.info("⏳ Gerando seu perfil literário... Você pode continuar navegando, o resultado aparecerá aqui.")
+        if tarefa.resultado:
+            st.markdown(tarefa.resultado)
+        return
+    concluir_tarefa_perfil(tarefa)
+
+def concluir_tarefa_perfil(tarefa):
+    st.session_state.pop("tarefa_perfil")
+    if tarefa is not None and tarefa.status == "concluido":
+        st.session_state.form_submitted = True
+        st.session_state.perfil = tarefa.resultado
+        st.session_state.aviso_perfil = "🎉 Perfil gerado com sucesso!"
+    else:
+        st.session_state.erro_perfil = tarefa.erro if tarefa is not None else "tarefa não encontrada"
+    st.rerun()
+
+def acompanhar_tarefa_analise(chave, tarefa_id):
+    saida = acompanhar_saida(tarefa_id)
+    if saida is None:
+        aguardar_tarefa_analise(chave, tarefa_id)
+        return
+    st.markdown("### 💡 Análise Gerada pela IA")
+    st.write_stream(saida)
+    tarefa = consultar_tarefa(engine, tarefa_id)
+    if tarefa is not None and tarefa.status in ("pendente", "executando"):
+        aguardar_tarefa_analise(chave, tarefa_id)
+        return
+    concluir_tarefa_analise(chave, tarefa)
+
+@st.fragment(run_every=2)
+def aguardar_tarefa_analise(chave, tarefa_id):
+    tarefa = consultar_tarefa(engine, tarefa_id)
+    if tarefa is not None and tarefa.status in ("pendente", "executando"):
+        st.info("⏳ A IA está analisando os perfis dos leitores...")
+        if tarefa.resultado:
+            st.markdown(tarefa.resultado)
+        return
+    concluir_tarefa_analise(chave, tarefa)
 
-def salvar_resposta(usuario, dados_dict, perfil_gerado):
-    with engine.begin() as conn:
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS respostas_formulario (
-                usuario TEXT PRIMARY KEY,
-                dados TEXT,
-                perfil_gerado TEXT,
-                data_envio TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """))
-        conn.execute(text("""
-            INSERT INTO respostas_formulario (usuario, dados, perfil_gerado, data_envio)
-            VALUES (:usuario, :dados, :perfil, :data_envio)
-            ON CONFLICT (usuario) DO UPDATE
-            SET dados = :dados, perfil_gerado = :perfil, data_envio = :data_envio
-        """), {
-            "usuario": usuario,
-            "dados": dados_dict if isinstance(dados_dict, str) else json.dumps(dados_dict),
-            "perfil": perfil_gerado,
-            "data_envio": datetime.now()
-        })
-
-def buscar_resposta_existente(usuario):
-    with engine.connect() as conn:
-        return conn.execute(text("""
-            SELECT dados, perfil_gerado FROM respostas_formulario
-            WHERE usuario = :usuario
-        """), {"usuario": usuario}).fetchone()
-
-def carregar_dados():
-    try:
-        with engine.connect() as conn:
-            df = pd.read_sql("SELECT * FROM respostas_formulario", conn)
-            if "dados" in df.columns:
-                df["dados"] = df["dados"].apply(lambda x: json.dumps(x) if isinstance(x, dict) else x)
-                dados_dicts = df["dados"].apply(json.loads).apply(pd.Series)
-                df = pd.concat([df.drop(columns=["dados"]), dados_dicts], axis=1)
-            if "data_envio" in df.columns:
-                df["data_envio"] = pd.to_datetime(df["data_envio"])
-            return df
-    except Exception as e:
-        st.error(f"❌ Erro ao carregar os dados do banco: {e}")
-        return pd.DataFrame()
+def concluir_tarefa_analise(chave, tarefa):
+    st.session_state.tarefas_analise.pop(chave, None)
+    if tarefa is not None and tarefa.status == "concluido":
+        st.session_state.analises_ia[chave] = tarefa.resultado
+    else:
+        st.session_state.erros_analise[chave] = tarefa.erro if tarefa is not None else "tarefa não encontrada"
+    st.rerun()
 
 # Painel do Escritor Conteúdo
 def painel_escritor_conteudo():
@@ -233,129 +318,205 @@ def painel_escritor_conteudo():
     </div>
     """, unsafe_allow_html=True)
 
+    # Opções de filtro e gráficos vêm da tabela de contagens mantida por salvar_resposta
     try:
-        df = carregar_dados()
-        if df.empty:
+        datas_disponiveis, _ = opcoes_de_filtro(engine)
+        if not datas_disponiveis:
             st.warning("Ainda não há dados suficientes para análise.")
             st.info("Convide mais leitores para preencherem o formulário de preferências para que a análise de dados seja mais rica!")
             return
     except Exception as e:
         st.error(f"❌ Erro ao carregar os dados: {e}")
         return
-    # Filtro por data de envio
-    if "data_envio" in df.columns:
-        datas_disponiveis = sorted(df["data_envio"].dt.date.unique())
-        data_escolhida = st.selectbox("📅 Filtrar por data de preenchimento:", ["Todas"] + [str(data) for data in datas_disponiveis])
-        if data_escolhida != "Todas":
-            df = df[df["data_envio"].dt.date == pd.to_datetime(data_escolhida).date()]
-        
-    faixa_etaria_opcao = st.selectbox("Filtrar por faixa etária:", ["Todas"] + sorted(df["idade"].dropna().unique().tolist()))
+    periodo = st.date_input("🗓️ Período de preenchimento:",
+                            value=(datas_disponiveis[0], datas_disponiveis[-1]),
+                            min_value=datas_disponiveis[0], max_value=datas_disponiveis[-1])
+    inicio, fim = (periodo[0], periodo[-1]) if isinstance(periodo, (list, tuple)) and periodo else (None, None)
+    # Período completo = sem filtro, para reaproveitar o cache compartilhado
+    if inicio == datas_disponiveis[0] and fim == datas_disponiveis[-1]:
+        inicio, fim = None, None
+
+    datas_no_periodo = [d for d in datas_disponiveis if (inicio is None or d >= inicio) and (fim is None or d <= fim)]
+    data_escolhida = st.selectbox("📅 Filtrar por data de preenchimento:", ["Todas"] + [str(data) for data in datas_no_periodo])
+    if data_escolhida != "Todas":
+        inicio = fim = date.fromisoformat(data_escolhida)
+
+    _, faixas_disponiveis = opcoes_de_filtro(engine, inicio, fim)
+    faixa_etaria_opcao = st.selectbox("Filtrar por faixa etária:", ["Todas"] + faixas_disponiveis)
+    idade = None
     if faixa_etaria_opcao != "Todas":
-        df = df[df["idade"] == faixa_etaria_opcao]
+        idade = faixa_etaria_opcao
+
+    contagens = contagens_respostas(engine, inicio, fim, idade)
 
     st.subheader("📊 Análise Estatística dos Leitores")
     col1, col2 = st.columns(2)
     with col1:
-        if "formato_livro" in df.columns:
+        if "formato_livro" in contagens:
             st.subheader("Formato de Leitura Preferido")
-            formatos_filtrados = df[df["formato_livro"].isin(["Físico", "Digital"])]
-            st.bar_chart(formatos_filtrados["formato_livro"].value_counts(), use_container_width=True)
+            formatos = contagens["formato_livro"]
+            st.bar_chart(formatos[formatos.index.isin(["Físico", "Digital"])], use_container_width=True)
 
     with col2:
-        if "generos" in df.columns:
-            generos_series = df["generos"].str.split(", ").explode()
+        if "generos" in contagens:
             st.subheader("Gêneros Literários Mais Citados")
-            st.bar_chart(generos_series.value_counts(), use_container_width=True)
+            st.bar_chart(contagens["generos"], use_container_width=True)
 
     col3, col4 = st.columns(2)
     with col3:
-        if "objetivo_leitura" in df.columns:
+        if "objetivo_leitura" in contagens:
             st.markdown("### Objetivo de Leitura")
-            st.bar_chart(df["objetivo_leitura"].value_counts())
+            st.bar_chart(contagens["objetivo_leitura"])
             st.subheader("Objetivo de Leitura")
-            st.bar_chart(df["objetivo_leitura"].value_counts(), use_container_width=True)
+            st.bar_chart(contagens["objetivo_leitura"], use_container_width=True)
 
     with col4:
-        if "sentimento_livro" in df.columns:
+        if "sentimento_livro" in contagens:
             st.markdown("### Sentimentos Desejados")
-            st.bar_chart(df["sentimento_livro"].value_counts(), use_container_width=True)
+            st.bar_chart(contagens["sentimento_livro"], use_container_width=True)
 
     st.subheader("📊 Faixa Etária dos Leitores")
-    if "idade" in df.columns:
-        st.bar_chart(df["idade"].value_counts(), use_container_width=True)
+    if "idade" in contagens:
+        st.bar_chart(contagens["idade"], use_container_width=True)
 
     st.subheader("📊 Frequência de Leitura")
-    if "frequencia_leitura" in df.columns:
-        st.bar_chart(df["frequencia_leitura"].value_counts(), use_container_width=True)
+    if "frequencia_leitura" in contagens:
+        st.bar_chart(contagens["frequencia_leitura"], use_container_width=True)
 
     st.subheader("📊 Estilos de Narrativa Preferidos")
-    if "narrativa" in df.columns:
-        st.bar_chart(df["narrativa"].value_counts(), use_container_width=True)
+    if "narrativa" in contagens:
+        st.bar_chart(contagens["narrativa"], use_container_width=True)
 
     st.subheader("📊 Tamanho Preferido dos Livros")
-    if "tamanho_livro" in df.columns:
-        st.bar_chart(df["tamanho_livro"].value_counts(), use_container_width=True)
-
-    csv = df.to_csv(index=False).encode("utf-8")
-    st.download_button("⬇️ Baixar dados filtrados (.csv)", data=csv, file_name="dados_filtrados.csv", mime="text/csv")
+    if "tamanho_livro" in contagens:
+        st.bar_chart(contagens["tamanho_livro"], use_container_width=True)
+
+    st.subheader("📋 Respostas dos Leitores")
+    # Só a página pedida sai do banco; o total da fatia vem junto, pela mesma consulta
+    # (ou por uma contagem à parte, se a página pedida já não existe)
+    por_pagina = 50
+    pagina_atual = st.session_state.get("pagina_respostas", 1)
+    pagina_df, total_respostas = pagina_respostas(engine, inicio, fim, idade, pagina_atual, por_pagina)
+    total_paginas = max(1, -(-total_respostas // por_pagina))
+    if pagina_atual > total_paginas:
+        # A fatia encolheu (outro filtro): volta para a última página que existe
+        pagina_atual = st.session_state.pagina_respostas = total_paginas
+        pagina_df, total_respostas = pagina_respostas(engine, inicio, fim, idade, pagina_atual, por_pagina)
+    st.number_input("Página", min_value=1, max_value=total_paginas, step=1, key="pagina_respostas")
+    st.caption(f"{total_respostas} respostas na seleção · página {pagina_atual} de {total_paginas}")
+    st.dataframe(pagina_df, use_container_width=True, hide_index=True)
+
+    # O arquivo só é montado quando alguém clica em baixar, lendo o banco em lotes
+    formato = st.radio("Formato do arquivo", list(FORMATOS), horizontal=True, key="formato_exportacao")
+    exportar, nome_arquivo, mime = FORMATOS[formato]
+    st.download_button(f"⬇️ Baixar dados filtrados (.{nome_arquivo.rsplit('.', 1)[-1]})",
+                       data=lambda: gravar_exportacao(exportar(engine, inicio, fim, idade)),
+                       file_name=nome_arquivo, mime=mime)
 
     st.header("💡 Sugestões para Escrita com IA")
     try:
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        chat = model.start_chat()
-
-        textos = " ".join(df["perfil_gerado"].dropna()).lower().strip()
-        if not textos:
+        total_perfis, assinatura = assinatura_fatia(engine, inicio, fim, idade)
+        if not total_perfis:
             st.warning("⚠️ Não há perfis suficientes para análise para a IA.")
             return
 
-        data_atual = datetime.now().strftime("%B de %Y")
         faixa_info = f" da faixa etária: {faixa_etaria_opcao}" if faixa_etaria_opcao != "Todas" else ""
+        parametros = {
+            "inicio": inicio.isoformat() if inicio else None,
+            "fim": fim.isoformat() if fim else None,
+            "idade": idade,
+            "faixa_info": faixa_info,
+        }
+
+        # A análise fica guardada por recorte e versão dos dados: outros visitantes e
+        # outros cliques no mesmo recorte reaproveitam o resultado; só o botão força uma nova
+        chave = chave_analise(parametros, assinatura)
+        parametros["chave"] = chave
+        for estado in ("analises_ia", "tarefas_analise", "erros_analise"):
+            st.session_state.setdefault(estado, {})
+
+        atualizar = st.button("🔄 Gerar nova análise", key="atualizar_analise")
+        if atualizar:
+            st.session_state.analises_ia.pop(chave, None)
+
+        if chave in st.session_state.erros_analise:
+            st.warning(f"❌ Erro na análise com IA: {st.session_state.erros_analise.pop(chave)}")
+            return
+
+        analise = st.session_state.analises_ia.get(chave)
+        if analise is None and not atualizar and chave not in st.session_state.tarefas_analise:
+            analise = buscar_no_cache(engine, chave, TTL_ANALISE)
+        if analise is None:
+            tarefa_id = (st.session_state.tarefas_analise.get(chave)
+                         or buscar_tarefa_por_chave(engine, "analise_escritor", chave))
+            if tarefa_id is None:
+                tarefa_id = enfileirar(engine, "analise_escritor", parametros,
+                                       usuario=st.session_state.get("logged_user"), chave=chave)
+            st.session_state.tarefas_analise[chave] = tarefa_id
+            acompanhar_tarefa_analise(chave, tarefa_id)
+            return
 
-        prompt = f"""
-        Hoje é {data_atual}. Você é um consultor literário com acesso a perfis reais de leitores brasileiros{faixa_info}.
-        Seu objetivo é ajudar escritores a adaptar seus textos para alcançar esse público com mais impacto.
-
-        Com base nos dados coletados da plataforma, analise os seguintes aspectos:
-        1. Formatos de leitura mais utilizados (físico ou digital)
-        2. Gêneros literários mais citados
-        3. Objetivos que os leitores têm ao escolher um livro
-        4. Sentimentos que os leitores buscam ao ler
-        5. Faixa etária predominante dos leitores
-        6. Frequência e tempo dedicado à leitura
-        7. Estilos narrativos preferidos
-        8. Tamanho de livro mais apreciado
-
-        **A partir disso, gere recomendações práticas para escritores**, como:
-        - Qual tipo de enredo pode envolver mais o leitor
-        - Que estilo narrativo utilizar
-        - Que tipo de linguagem é mais adequada
-        - Como estruturar os personagens
-        - Qual o tamanho ideal de livro
-        - Como conectar emocionalmente com o leitor
-
-        **Justifique cada recomendação com base nos dados analisados. Use termos, padrões e preferências reais dos leitores.**
-        Não escreva como um chatbot. Não faça perguntas. Apenas forneça as sugestões com explicações claras e fundamentadas.
-
-        Perfis analisados:
-        {textos}
-        """.strip()
-
-        response = chat.send_message(prompt.strip())
         st.markdown("### 💡 Análise Gerada pela IA")
-        st.markdown(f'<div class="justified-text">{response.text}</div>', unsafe_allow_html=True)
-        st.download_button("⬇️ Baixar Análise", data=response.text, file_name="analise_ia.txt")
+        st.markdown(f'<div class="justified-text">{analise}</div>', unsafe_allow_html=True)
+        st.download_button("⬇️ Baixar Análise", data=analise, file_name="analise_ia.txt")
 
     except Exception as e:
         st.warning(f"❌ Erro na análise com IA: {e}")
 
+# Página de métricas, visível só para os usuários em ADMIN_USERS
+def pagina_metricas():
+    import pandas as pd
+    st.header("📈 Métricas do Sistema")
+    st.subheader("Conexões com o banco")
+    pool = metricas_pool(engine)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Em uso", f"{pool['em_uso']} / {pool['limite']}")
+    col2.metric("Livres no pool", pool["livres"])
+    col3.metric("Overflow", pool["overflow"])
+    col4.metric("Checkouts esgotados", pool.get("tempos_esgotados", 0))
+    col5, col6, col7 = st.columns(3)
+    col5.metric("Espera média", f"{pool.get('espera_media_ms', 0):.1f} ms")
+    col6.metric("Espera p95", f"{pool.get('espera_p95_ms', 0):.1f} ms")
+    col7.metric("Espera máxima", f"{pool.get('espera_maxima_ms', 0):.1f} ms")
+
+    st.subheader("Cache de respostas")
+    st.json(estatisticas_cache_respostas())
+    st.subheader("Índice de leitores parecidos")
+    st.json(estatisticas_similares())
+
+    # Percentis das medições deste processo (execuções, SQL, modelo e DataFrames)
+    st.subheader("Tempos por execução e por etapa")
+    metricas = resumo()
+    if metricas:
+        st.dataframe(pd.DataFrame(metricas).round(2), use_container_width=True, hide_index=True)
+    else:
+        st.info("Ainda não há medições neste processo.")
+    st.caption("Execuções em ms; SQL e modelo em ms; DataFrames em linhas e MB.")
+    execucoes = ultimas_execucoes()
+    if execucoes:
+        st.markdown("**Últimas execuções**")
+        st.dataframe(pd.DataFrame(execucoes), use_container_width=True, hide_index=True)
+    st.download_button("📥 Baixar no formato Prometheus", texto_prometheus(),
+                       file_name="metricas_litme.prom", mime="text/plain")
+
+def preparar_banco():
+    # Uma vez por processo (as chamadas seguintes não vão ao banco): esquema
+    # atualizado e tarefas interrompidas de volta à fila
+    migrar_uma_vez(engine)
+    retomar_tarefas_interrompidas(engine)
+
 # Lógica Principal da Aplicação
-verificar_ou_criar_tabela_usuarios()
+iniciar_execucao()
 
 if "current_page" not in st.session_state:
     st.session_state.current_page = "login"
 
+# A tela de login não toca no banco: as migrações rodam na primeira ação que o
+# usa (entrar, cadastrar) ou ao abrir qualquer outra tela
+na_tela_de_login = "logged_user" not in st.session_state and st.session_state.current_page == "login"
+if not na_tela_de_login:
+    preparar_banco()
+
 if "logged_user" not in st.session_state and st.session_state.current_page == "login":
     col_left_login, col_center_login, col_right_login = st.columns([1, 2, 1])
 
@@ -374,10 +535,12 @@ if "logged_user" not in st.session_state and st.session_state.current_page == "l
             login_user = st.text_input("Nome de Usuário", key="login_user_main")
             login_pass = st.text_input("Senha", type="password", key="login_pass_main")
             if st.button("Entrar", key="btn_login_main"):
+                preparar_banco()
                 user = autenticar_usuario(login_user, login_pass)
                 if user:
                     st.session_state.logged_user = user.username
                     st.session_state.logged_name = user.nome
+                    st.session_state.resposta_usuario = resposta_da_linha(user)
                     st.session_state.current_page = "leitor"
                     st.success(f"Bem-vindo(a), {user.nome}! Redirecionando...")
                     st.rerun()
@@ -390,6 +553,7 @@ if "logged_user" not in st.session_state and st.session_state.current_page == "l
             new_name = st.text_input("Seu Nome Completo", key="new_name_main")
             new_pass = st.text_input("Escolha uma Senha", type="password", key="signup_pass_main")
             if st.button("Cadastrar", key="btn_signup_main"):
+                preparar_banco()
                 try:
                     cadastrar_usuario(new_user, new_name, new_pass)
                     st.success("Conta criada com sucesso! Agora você pode fazer login.")
@@ -429,7 +593,8 @@ else:
         st.image("static/logo_litme.jpg", use_container_width=True)
         st.write(f"👤 **Bem-vindo(a):** {st.session_state.logged_name}")
         if st.button("Logout", key="btn_logout_sidebar"):
-            for key in ["logged_user", "logged_name", "form_submitted", "perfil", "current_page"]:
+            for key in ["logged_user", "logged_name", "form_submitted", "perfil", "current_page",
+                        "tarefa_perfil", "tarefas_verificadas", "resposta_usuario", "dados_formulario"]:
                 st.session_state.pop(key, None)
             st.session_state.current_page = "login"
             st.rerun()
@@ -438,19 +603,47 @@ else:
         if "pagina_selecionada" not in st.session_state:
             st.session_state.pagina_selecionada = "📖 Perfil do Leitor"
 
-        pagina = st.radio("Escolha uma seção:",
-                            ["📖 Perfil do Leitor", "🎮 Gamificação", "✍️ Painel do Escritor"],
-                            index=["📖 Perfil do Leitor", "🎮 Gamificação", "✍️ Painel do Escritor"].index(st.session_state.pagina_selecionada))
+        paginas = ["📖 Perfil do Leitor", "🎮 Gamificação", "✍️ Painel do Escritor"]
+        if st.session_state.logged_user in ADMIN_USERS:
+            paginas.append("📈 Métricas")
+        if st.session_state.pagina_selecionada not in paginas:
+            st.session_state.pagina_selecionada = paginas[0]
+        pagina = st.radio("Escolha uma seção:", paginas,
+                            index=paginas.index(st.session_state.pagina_selecionada))
         st.session_state.pagina_selecionada = pagina
 
     if pagina == "📖 Perfil do Leitor":
         st.header("📖 Seu Perfil Literário Detalhado")
-        resposta_existente = buscar_resposta_existente(st.session_state.logged_user)
-        if resposta_existente and "form_submitted" not in st.session_state:
+        # Vem da sessão: os cliques no formulário não consultam o banco a cada rerun
+        resposta_existente = resposta_da_sessao()
+        if resposta_existente.dados is not None and "form_submitted" not in st.session_state:
             st.session_state.form_submitted = True
             st.session_state.perfil = resposta_existente.perfil_gerado
 
-        if "form_submitted" not in st.session_state:
+        # Uma vez por sessão, retoma o acompanhamento de uma geração iniciada antes de um F5
+        if "tarefas_verificadas" not in st.session_state:
+            st.session_state.tarefas_verificadas = True
+            tarefa_ativa = buscar_tarefa_ativa(engine, st.session_state.logged_user, "perfil_leitor")
+            if tarefa_ativa:
+                st.session_state.tarefa_perfil = tarefa_ativa
+
+        if "aviso_perfil" in st.session_state:
+            st.success(st.session_state.pop("aviso_perfil"))
+        if "erro_perfil" in st.session_state:
+            st.error(f"❌ Erro ao gerar o perfil: {st.session_state.pop('erro_perfil')}")
+
+        if "tarefa_perfil" in st.session_state and "form_submitted" not in st.session_state:
+            # As sugestões do índice local aparecem enquanto o modelo escreve o perfil
+            if "dados_formulario" in st.session_state:
+                mostrar_leitores_parecidos(engine, st.session_state.dados_formulario, st.session_state.logged_user)
+                st.markdown("---")
+            acompanhar_tarefa_perfil()
+
+        elif "form_submitted" not in st.session_state:
+            # Se a geração falhou (ex.: API fora do ar), as sugestões locais continuam valendo
+            if "dados_formulario" in st.session_state:
+                mostrar_leitores_parecidos(engine, st.session_state.dados_formulario, st.session_state.logged_user)
+                st.markdown("---")
             st.subheader("📋 Formulário de Preferências de Leitura")
             st.info("Por favor, preencha este formulário para que possamos entender suas preferências e gerar um perfil literário para você.")
 
@@ -600,108 +793,68 @@ else:
                     if missing_fields:
                         st.error(f"Por favor, preencha as seguintes informações obrigatórias: {', '.join(missing_fields)}")
                     else:
-                        with st.spinner("Gerando seu perfil literário... Isso pode levar alguns segundos."):
-                            dados = {
-                                "idade": idade,
-                                "frequencia_leitura": frequencia_leitura,
-                                "tempo_leitura": tempo_leitura,
-                                "local_leitura": local_leitura,
-                                "tipo_livro": tipo_livro,
-                                "generos": ", ".join(generos),
-                                "genero_outro": genero_outro,
-                                "autor_favorito": autor_favorito,
-                                "tamanho_livro": tamanho_livro,
-                                "narrativa": narrativa,
-                                "sentimento_livro": sentimento_livro,
-                                "questoes_sociais": questoes_sociais,
-                                "releitura": releitura,
-                                "formato_livro": formato_livro,
-                                "influencia": influencia,
-                                "avaliacoes": avaliacoes,
-                                "audiolivros": audiolivros,
-                                "interesse_artigos": interesse_artigos,
-                                "area_academica": area_academica,
-                                "objetivo_leitura": objetivo_leitura,
-                                "tipo_conteudo": tipo_conteudo,
-                                "nivel_leitura": nivel_leitura,
-                                "velocidade": velocidade,
-                                "curiosidade": curiosidade,
-                                "contexto_cultural": contexto_cultural,
-                                "memoria": memoria,
-                                "leitura_em_ingles": leitura_em_ingles
-                            }
-
-                            genai.configure(api_key=gemini_api_key)
-                            prompt = (
-                                 "**Atue como um PSICÓLOGO LITERÁRIO altamente perspicaz e intuitivo.**\n"
-                                "Sua missão é ir MUITO ALÉM das respostas diretas do formulário abaixo. **Não cite, reitere, ou faça qualquer referência explícita às informações exatas que foram fornecidas.** Ou seja, não mencione a origem de nenhum dado, como 'a preferência por', 'a recusa em', 'o interesse em', que remetam diretamente a uma resposta do formulário.\n"
-                                "Em vez disso, analise as entrelinhas para **TRAÇAR UM RETRATO PSICOLÓGICO REVELADOR e SURPREENDENTE do leitor, identificando suas tendências, motivações e anseios subjacentes.** Seu objetivo é apresentar insights que o próprio leitor, ao ler, dirá: 'Uau, eu não tinha percebido isso sobre mim!'.\n"
-                                "Conecte os traços de forma fluida e integrada, como se estivesse descrevendo a essência de uma personalidade complexa, e não um conjunto de dados. Foque em:\n"
-                                "1.  **Forças e Desafios Inerentes:** O que define intrinsecamente este leitor e onde pode haver pontos de crescimento.\n"
-                                "2.  **Desejos Não Articulados:** O que o leitor busca na leitura que ele mesmo não consegue expressar claramente.\n"
-                                "3.  **Paradoxos e Equilíbrios:** Onde há aparentemente uma contradição, mas na verdade revela uma característica única.\n"
-                                "4.  **Implicações de Hábitos:** O que os hábitos de leitura (onde, quando, como) revelam sobre sua psicologia.\n\n"
-                                "Apresente este 'diagnóstico literário' em uma narrativa única, profunda e sem clichês, focando na descoberta de traços que vão além do óbvio.\n\n"
-                                "--- # Fim do Perfil\n\n" # Linha de separação clara
-                                "**Com base EXCLUSIVAMENTE nas tendências e motivações REVELADAS neste retrato psicológico (e sem repetir NENHUM dado bruto do formulário, nem mesmo inferências óbvias que já estavam no formulário), RECOMENDE:**\n"
-                                "1.  **Livros relevantes**, com justificativas que explorem as conexões com as **tendências e anseios mais profundos** revelados no perfil.\n"
-                                "2.  **Artigos acadêmicos apropriados**, detalhando a conexão com **áreas de pesquisa que complementem ou desafiem** as motivações subjacentes identificadas no retrato.\n\n"
-                                "**Além disso, identifique uma ou duas possíveis novas áreas ou gêneros que o leitor poderia explorar**, com base nas suas preferências e inferências do perfil, e **sugira um ou dois títulos** que se encaixem nessa expansão, justificando a sugestão.\n\n"
-                                "**Estruture a resposta claramente com o '## Perfil Literário' primeiro, seguido por '## Recomendações de Livros', '## Recomendações de Artigos Acadêmicos' e, por último, '## Sugestões de Expansão de Interesses'.**\n"
-                                f"**Dados do Formulário para Análise:**\n{json.dumps(dados, indent=2, ensure_ascii=False)}"
-                            )                  
-                            model = genai.GenerativeModel("gemini-2.0-flash")
-                            chat = model.start_chat()
-                            response = chat.send_message(prompt)
-                            perfil = response.text
-
-                            salvar_resposta(st.session_state.logged_user, dados, perfil)
-                            st.session_state.form_submitted = True
-                            st.session_state.perfil = perfil
-                            st.success("🎉 Perfil gerado com sucesso!")
-                            st.rerun()
+                        dados = {
+                            "idade": idade,
+                            "frequencia_leitura": frequencia_leitura,
+                            "tempo_leitura": tempo_leitura,
+                            "local_leitura": local_leitura,
+                            "tipo_livro": tipo_livro,
+                            "generos": ", ".join(generos),
+                            "genero_outro": genero_outro,
+                            "autor_favorito": autor_favorito,
+                            "tamanho_livro": tamanho_livro,
+                            "narrativa": narrativa,
+                            "sentimento_livro": sentimento_livro,
+                            "questoes_sociais": questoes_sociais,
+                            "releitura": releitura,
+                            "formato_livro": formato_livro,
+                            "influencia": influencia,
+                            "avaliacoes": avaliacoes,
+                            "audiolivros": audiolivros,
+                            "interesse_artigos": interesse_artigos,
+                            "area_academica": area_academica,
+                            "objetivo_leitura": objetivo_leitura,
+                            "tipo_conteudo": tipo_conteudo,
+                            "nivel_leitura": nivel_leitura,
+                            "velocidade": velocidade,
+                            "curiosidade": curiosidade,
+                            "contexto_cultural": contexto_cultural,
+                            "memoria": memoria,
+                            "leitura_em_ingles": leitura_em_ingles
+                        }
+
+                        # A geração roda em segundo plano; a página acompanha a tarefa
+                        st.session_state.dados_formulario = dados
+                        st.session_state.tarefa_perfil = enfileirar(
+                            engine, "perfil_leitor",
+                            {"usuario": st.session_state.logged_user, "dados": dados},
+                            usuario=st.session_state.logged_user
+                        )
+                        st.rerun()
 
         else:
             st.markdown(f'<div class="justified-text">{st.session_state.perfil}</div>', unsafe_allow_html=True)
             st.markdown("---")
+            if resposta_existente.dados is not None:
+                mostrar_leitores_parecidos(engine, resposta_existente.dados, st.session_state.logged_user)
+                st.markdown("---")
             st.subheader("Gerar Novas Recomendações?")
             st.info("Você pode gerar novas recomendações com base no seu perfil atual.")
 
             col_left_actions, col_actions, col_right_actions = st.columns([1, 3, 1])
             with col_actions:
-                if st.button("🔄 Gerar nova recomendação", key="btn_nova_recomendacao"):
-                    with st.spinner("Gerando nova recomendação..."):
-                        resposta_existente = buscar_resposta_existente(st.session_state.logged_user)
-                        if resposta_existente:
-                            dados = resposta_existente.dados if isinstance(resposta_existente.dados, dict) else json.loads(resposta_existente.dados)
-                            genai.configure(api_key=gemini_api_key)
-                            prompt = (
-                               "**Atue como um PSICÓLOGO LITERÁRIO altamente perspicaz e intuitivo.**\n"
-                                "Sua missão é ir MUITO ALÉM das respostas diretas do formulário abaixo. **Não cite, reitere, ou faça qualquer referência explícita às informações exatas que foram fornecidas.** Ou seja, não mencione a origem de nenhum dado, como 'a preferência por', 'a recusa em', 'o interesse em', que remetam diretamente a uma resposta do formulário.\n"
-                                "Em vez disso, analise as entrelinhas para **TRAÇAR UM RETRATO PSICOLÓGICO REVELADOR e SURPREENDENTE do leitor, identificando suas tendências, motivações e anseios subjacentes.** Seu objetivo é apresentar insights que o próprio leitor, ao ler, dirá: 'Uau, eu não tinha percebido isso sobre mim!'.\n"
-                                "Conecte os traços de forma fluida e integrada, como se estivesse descrevendo a essência de uma personalidade complexa, e não um conjunto de dados. Foque em:\n"
-                                "1.  **Forças e Desafios Inerentes:** O que define intrinsecamente este leitor e onde pode haver pontos de crescimento.\n"
-                                "2.  **Desejos Não Articulados:** O que o leitor busca na leitura que ele mesmo não consegue expressar claramente.\n"
-                                "3.  **Paradoxos e Equilíbrios:** Onde há aparentemente uma contradição, mas na verdade revela uma característica única.\n"
-                                "4.  **Implicações de Hábitos:** O que os hábitos de leitura (onde, quando, como) revelam sobre sua psicologia.\n\n"
-                                "Apresente este 'diagnóstico literário' em uma narrativa única, profunda e sem clichês, focando na descoberta de traços que vão além do óbvio.\n\n"
-                                "--- # Fim do Perfil\n\n" # Linha de separação clara
-                                "**Com base EXCLUSIVAMENTE nas tendências e motivações REVELADAS neste retrato psicológico (e sem repetir NENHUM dado bruto do formulário, nem mesmo inferências óbvias que já estavam no formulário), RECOMENDE:**\n"
-                                "1.  **Livros relevantes**, com justificativas que explorem as conexões com as **tendências e anseios mais profundos** revelados no perfil.\n"
-                                "2.  **Artigos acadêmicos apropriados**, detalhando a conexão com **áreas de pesquisa que complementem ou desafiem** as motivações subjacentes identificadas no retrato.\n\n"
-                                "**Além disso, identifique uma ou duas possíveis novas áreas ou gêneros que o leitor poderia explorar**, com base nas suas preferências e inferências do perfil, e **sugira um ou dois títulos** que se encaixem nessa expansão, justificando a sugestão.\n\n"
-                                "**Estruture a resposta claramente com o '## Perfil Literário' primeiro, seguido por '## Recomendações de Livros', '## Recomendações de Artigos Acadêmicos' e, por último, '## Sugestões de Expansão de Interesses'.**\n"
-                                f"**Dados do Formulário para Análise:**\n{json.dumps(dados, indent=2, ensure_ascii=False)}"
-                            )
-                            model = genai.GenerativeModel("gemini-2.0-flash")
-                            chat = model.start_chat()
-                            response = chat.send_message(prompt)
-                            perfil = response.text
-
-                            salvar_resposta(st.session_state.logged_user, dados, perfil)
-                            st.session_state.perfil = perfil
-                            st.success("✅ Nova recomendação gerada!")
-                            st.rerun()
+                if "tarefa_perfil" in st.session_state:
+                    acompanhar_tarefa_perfil()
+                elif st.button("🔄 Gerar nova recomendação", key="btn_nova_recomendacao"):
+                    if resposta_existente.dados is not None:
+                        dados = resposta_existente.dados
+                        # O botão pede explicitamente uma resposta nova, ignorando o cache
+                        st.session_state.tarefa_perfil = enfileirar(
+                            engine, "perfil_leitor",
+                            {"usuario": st.session_state.logged_user, "dados": dados, "forcar_novo": True},
+                            usuario=st.session_state.logged_user
+                        )
+                        st.rerun()
 
     elif pagina == "🎮 Gamificação":
         if "logged_user" in st.session_state:
@@ -709,6 +862,10 @@ else:
             st.title("🎮 Gamificação da Leitura")
 
             registrar_leitura(engine, usuario)
+            mostrar_importacao(engine, usuario)
+
+            # Uma única consulta alimenta todos os blocos da página
+            painel = carregar_painel_gamificacao(engine, usuario)
 
             # --- Bloco de Status do Usuário em um único highlight-container ---
             st.markdown("---")
@@ -718,52 +875,34 @@ else:
             
             with col1_perf:
                 st.subheader("Pontos")
-                pontos, _ = calcular_pontos_e_nivel(engine, usuario)
-                st.metric(label="Total", value=pontos)
+                st.metric(label="Total", value=painel.pontos)
             
             with col2_perf:
                 st.subheader("Nível")
-                _, nivel = calcular_pontos_e_nivel(engine, usuario)
-                st.metric(label="Atual", value=nivel)
-
-            # Calcular a colocação do usuário
-            with engine.connect() as conn:
-                ranking_data = conn.execute(text("""
-                    SELECT u.username, COALESCE(SUM(p.paginas_lidas) + COUNT(*) FILTER (WHERE p.livro_finalizado) * 50, 0) as pontos
-                    FROM usuarios u
-                    LEFT JOIN progresso_leitura p ON u.username = p.username
-                    GROUP BY u.username
-                    ORDER BY pontos DESC
-                """)).fetchall()
-            
-            sua_colocacao = None
-            for i, r in enumerate(ranking_data):
-                if r.username == usuario:
-                    sua_colocacao = i + 1
-                    break
-            
+                st.metric(label="Atual", value=painel.nivel)
+
             with col3_perf:
                 st.subheader("Colocação")
-                if sua_colocacao is not None:
-                    st.metric(label="No Ranking", value=f"{sua_colocacao}º")
-                else:
-                    st.metric(label="No Ranking", value="N/A") # Ou uma mensagem indicando que não está no ranking ainda
+                st.metric(label="No Ranking", value=f"{painel.posicao}º")
+
+            if painel.sequencia_dias > 1:
+                st.caption(f"🔥 {painel.sequencia_dias} dias seguidos de leitura")
 
             st.markdown("</div>", unsafe_allow_html=True)
             # --- Fim do Bloco de Status do Usuário ---
             
             st.markdown("---")
-            mostrar_conquistas(engine, usuario)
+            mostrar_conquistas(painel)
             
             st.markdown("---")
-            ranking_top(engine) 
+            mostrar_ranking(painel)
 
             st.markdown("---")
             st.subheader("🔥 Desafio da Semana")
             st.info(desafio_ativo()) # Exibe a descrição do desafio
             
             # Valida e exibe a mensagem do desafio
-            if validar_desafio(engine, usuario):
+            if painel.desafio_concluido:
                 st.success("✅ Desafio concluído! Você ganhou 50 pontos bônus.")
             else:
                 st.warning("📚 Continue lendo para concluir o desafio!")
@@ -773,4 +912,10 @@ else:
     elif pagina == "✍️ Painel do Escritor":
         col_left_writer, col_writer, col_right_writer = st.columns([1, 3, 1])
         with col_writer:
-            painel_escritor_conteudo()
\ No newline at end of file
+            painel_escritor_conteudo()
+
+    elif pagina == "📈 Métricas" and st.session_state.logged_user in ADMIN_USERS:
+        pagina_metricas()
+
+finalizar_execucao(st.session_state.get("pagina_selecionada") if "logged_user" in st.session_state
+                   else st.session_state.get("current_page", "login"))
@@ -0,0 +1,217 @@
+# tarefas.py
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from sqlalchemy import text
+
+# Geração de perfis e análises roda fora da thread do Streamlit, em um pool do processo.
+# O estado fica na tabela jobs, então um rerun ou um F5 não perdem o trabalho.
+MAX_WORKERS = int(os.getenv("TAREFAS_WORKERS", "4"))
+TEMPO_MAXIMO_EXECUCAO = timedelta(minutes=int(os.getenv("TAREFAS_TIMEOUT_MINUTOS", "10")))
+
+STATUS_ATIVOS = ("pendente", "executando")
+INTERVALO_GRAVACAO_PARCIAL = 1.0
+# Quem acompanha a saída desiste depois desse tempo sem pedaços novos e passa a
+# consultar a tabela jobs; assim a thread do script nunca fica presa no worker
+ESPERA_PEDACO = float(os.getenv("TAREFAS_ESPERA_PEDACO_SEGUNDOS", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="litme-tarefa")
+_tipos = {}
+_parciais = {}
+_retomadas = False
+_lock_retomada = threading.Lock()
+
+class _SaidaParcial:
+    # Texto produzido até agora por uma tarefa em streaming neste processo
+    def __init__(self):
+        self.partes = []
+        self.terminou = False
+        self.condicao = threading.Condition()
+
+    def adicionar(self, parte):
+        with self.condicao:
+            self.partes.append(parte)
+            self.condicao.notify_all()
+
+    def finalizar(self):
+        with self.condicao:
+            self.terminou = True
+            self.condicao.notify_all()
+
+    def acompanhar(self):
+        # Reentrega o que já foi gerado e segue esperando os próximos pedaços. Termina
+        # quando a tarefa acaba ou quando passa ESPERA_PEDACO sem novidade; quem chama
+        # confere o status no banco para saber qual dos dois aconteceu.
+        entregues = 0
+        while True:
+            with self.condicao:
+                if entregues == len(self.partes) and not self.terminou:
+                    self.condicao.wait(ESPERA_PEDACO)
+                novas = self.partes[entregues:]
+                terminou = self.terminou
+            if not novas and not terminou:
+                return
+            entregues += len(novas)
+            yield from novas
+            if terminou and entregues == len(self.partes):
+                return
+
+def criar_tabela_jobs(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id SERIAL PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                usuario TEXT,
+                parametros TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pendente',
+                resultado TEXT,
+                erro TEXT,
+                criado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                atualizado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS jobs_ativos_idx ON jobs (usuario, tipo)
+            WHERE status IN ('pendente', 'executando');
+        """))
+
+def adicionar_chave_jobs(engine):
+    # Chave de deduplicação em coluna própria, indexada só entre as tarefas ativas:
+    # buscar_tarefa_por_chave roda a cada renderização do painel
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE jobs ADD COLUMN IF NOT EXISTS chave TEXT"))
+        conn.execute(text("""
+            UPDATE jobs SET chave = CAST(parametros AS JSONB) ->> 'chave'
+            WHERE status IN ('pendente', 'executando') AND chave IS NULL
+        """))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS jobs_ativos_chave_idx ON jobs (tipo, chave)
+            WHERE status IN ('pendente', 'executando') AND chave IS NOT NULL;
+        """))
+
+def registrar_tipo(tipo, funcao):
+    # `funcao` recebe o dicionário de parâmetros e devolve o resultado em texto,
+    # ou um gerador de pedaços de texto quando a resposta é produzida em streaming
+    _tipos[tipo] = funcao
+
+def enfileirar(engine, tipo, parametros, usuario=None, chave=None):
+    # `chave` identifica tarefas equivalentes para buscar_tarefa_por_chave
+    with engine.begin() as conn:
+        tarefa_id = conn.execute(text("""
+            INSERT INTO jobs (tipo, usuario, parametros, chave)
+            VALUES (:tipo, :usuario, :parametros, :chave)
+            RETURNING id
+        """), {"tipo": tipo, "usuario": usuario, "parametros": json.dumps(parametros, ensure_ascii=False),
+               "chave": chave}).scalar()
+    _submeter(engine, tarefa_id)
+    return tarefa_id
+
+def _submeter(engine, tarefa_id):
+    _parciais[tarefa_id] = _SaidaParcial()
+    _executor.submit(_executar, engine, tarefa_id)
+
+def acompanhar_saida(tarefa_id):
+    # Gerador com os pedaços da tarefa à medida que chegam, ou None se ela não
+    # está rodando neste processo (nesse caso, consulte o resultado parcial no banco)
+    parcial = _parciais.get(tarefa_id)
+    return parcial.acompanhar() if parcial is not None else None
+
+def _gravar_parcial(engine, tarefa_id, texto):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE jobs SET resultado = :resultado, atualizado_em = CURRENT_TIMESTAMP
+            WHERE id = :id AND status = 'executando'
+        """), {"id": tarefa_id, "resultado": texto})
+
+def _executar(engine, tarefa_id):
+    parcial = _parciais.get(tarefa_id) or _SaidaParcial()
+    try:
+        # Só um worker consegue passar a tarefa de 'pendente' para 'executando'
+        with engine.begin() as conn:
+            tarefa = conn.execute(text("""
+                UPDATE jobs SET status = 'executando', atualizado_em = CURRENT_TIMESTAMP
+                WHERE id = :id AND status = 'pendente'
+                RETURNING tipo, parametros
+            """), {"id": tarefa_id}).fetchone()
+        # Tarefa já assumida por outro processo: a saída daqui termina vazia e quem
+        # acompanha passa a consultar o banco
+        if tarefa is None:
+            return
+        try:
+            saida = _tipos[tarefa.tipo](json.loads(tarefa.parametros))
+            if isinstance(saida, str):
+                parcial.adicionar(saida)
+            else:
+                # Em streaming, o texto parcial também vai para o banco de tempos em tempos,
+                # para quem acompanha a tarefa a partir de outro processo
+                ultima_gravacao = time.monotonic()
+                for parte in saida:
+                    parcial.adicionar(parte)
+                    if time.monotonic() - ultima_gravacao >= INTERVALO_GRAVACAO_PARCIAL:
+                        _gravar_parcial(engine, tarefa_id, "".join(parcial.partes))
+                        ultima_gravacao = time.monotonic()
+            resultado, status, erro = "".join(parcial.partes), "concluido", None
+        except Exception as e:
+            resultado, status, erro = None, "erro", str(e)
+
+        # O status final é gravado antes de liberar quem acompanha a saída
+        with engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE jobs SET status = :status, resultado = :resultado, erro = :erro,
+                       atualizado_em = CURRENT_TIMESTAMP
+                WHERE id = :id
+            """), {"id": tarefa_id, "status": status, "resultado": resultado, "erro": erro})
+    finally:
+        # Mesmo se o UPDATE final falhar, quem acompanha é liberado (e vê no banco
+        # que a tarefa não terminou)
+        parcial.finalizar()
+        _parciais.pop(tarefa_id, None)
+
+def consultar_tarefa(engine, tarefa_id):
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT id, tipo, status, resultado, erro FROM jobs WHERE id = :id
+        """), {"id": tarefa_id}).fetchone()
+
+def buscar_tarefa_ativa(engine, usuario, tipo):
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT id FROM jobs
+            WHERE usuario = :usuario AND tipo = :tipo AND status IN ('pendente', 'executando')
+            ORDER BY criado_em DESC
+            LIMIT 1
+        """), {"usuario": usuario, "tipo": tipo}).scalar()
+
+def buscar_tarefa_por_chave(engine, tipo, chave):
+    # Tarefa em andamento, de qualquer usuário, enfileirada com a mesma chave
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT id FROM jobs
+            WHERE tipo = :tipo AND status IN ('pendente', 'executando') AND chave = :chave
+            ORDER BY criado_em DESC
+            LIMIT 1
+        """), {"tipo": tipo, "chave": chave}).scalar()
+
+def retomar_tarefas_interrompidas(engine):
+    # Executado uma vez por processo: tarefas presas em 'executando' por um processo
+    # que reiniciou voltam para a fila, e as pendentes são reenviadas ao pool.
+    global _retomadas
+    with _lock_retomada:
+        if _retomadas:
+            return
+        _retomadas = True
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE jobs SET status = 'pendente', atualizado_em = CURRENT_TIMESTAMP
+            WHERE status = 'executando' AND atualizado_em < CURRENT_TIMESTAMP - :limite
+        """), {"limite": TEMPO_MAXIMO_EXECUCAO})
+        pendentes = conn.execute(text("""
+            SELECT id FROM jobs WHERE status = 'pendente' ORDER BY id
+        """)).scalars().all()
+    for tarefa_id in pendentes:
+        _submeter(engine, tarefa_id)
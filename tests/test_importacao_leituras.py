@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from importacao_leituras import validar_leituras
+
+def _arquivo(*linhas):
+    return pd.DataFrame(linhas, columns=["username", "data", "paginas_lidas", "livro_finalizado"])
+
+def test_aceita_os_dois_formatos_de_data_e_soma_o_mesmo_dia():
+    validas, erros = validar_leituras(_arquivo(
+        ("ana", "2024-03-05", "10", ""),
+        ("ana", "05/03/2024", "7", "sim"),
+    ))
+    assert erros.empty
+    assert validas.to_dict("records") == [
+        {"username": "ana", "data": date(2024, 3, 5), "paginas_lidas": 17, "livro_finalizado": True},
+    ]
+
+def test_data_no_futuro_e_invalida():
+    amanha = (date.today() + timedelta(days=1)).isoformat()
+    validas, erros = validar_leituras(_arquivo(
+        ("ana", amanha, "10", ""),
+        ("ana", "2024-02-30", "10", ""),
+    ))
+    assert validas.empty
+    assert erros.to_dict("records") == [
+        {"linha": 2, "motivo": "data no futuro"},
+        {"linha": 3, "motivo": "data inválida (use AAAA-MM-DD ou DD/MM/AAAA)"},
+    ]
+
+@pytest.mark.parametrize("paginas", ["3.5", "abc", "", "-1", "5001"])
+def test_paginas_fora_do_formato_sao_recusadas(paginas):
+    validas, erros = validar_leituras(_arquivo(("ana", "2024-03-05", paginas, "")))
+    assert validas.empty
+    assert len(erros) == 1 and erros["motivo"][0].startswith("páginas")
+
+def test_dia_sem_leitura_fica_de_fora():
+    validas, erros = validar_leituras(_arquivo(("ana", "2024-03-05", "0", "não")))
+    assert validas.empty and erros.empty
+
+def test_usuario_fixo_dispensa_a_coluna():
+    df = pd.DataFrame({"Data ": ["2024-03-05"], "PAGINAS_LIDAS": ["4"]})
+    validas, _ = validar_leituras(df, usuario="bia")
+    assert validas["username"].tolist() == ["bia"]
+
+def test_lotes_somam_como_o_arquivo_inteiro():
+    # Como em main(): o arquivo lido em pedaços, cada um validado à parte e somado
+    # por (usuário, dia) entre os lotes, como faz importar_leituras
+    linhas = [("ana" if i % 3 else "bia", f"2024-03-{1 + i % 4:02d}", str(i % 9), "") for i in range(50)]
+    linhas.append(("ana", "2099-01-01", "5", ""))
+    arquivo = _arquivo(*linhas)
+    inteiro, erros_inteiro = validar_leituras(arquivo)
+    for tamanho in (1, 7, 13):
+        pedacos = [validar_leituras(arquivo.iloc[i:i + tamanho]) for i in range(0, len(arquivo), tamanho)]
+        somado = (pd.concat([v for v, _ in pedacos])
+                  .groupby(["username", "data"], as_index=False)
+                  .agg({"paginas_lidas": "sum", "livro_finalizado": "any"}))
+        assert somado.to_dict("records") == inteiro.to_dict("records")
+        # A linha dos erros é a do arquivo, não a do lote
+        assert pd.concat([e for _, e in pedacos])["linha"].tolist() == erros_inteiro["linha"].tolist() == [52]
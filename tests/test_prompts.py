@@ -0,0 +1,49 @@
+import pandas as pd
+
+from prompts import amostra_estratificada, estimar_tokens
+
+IDADES = ["18 a 24", "25 a 34", "35 a 44"]
+GENEROS = ["Fantasia", "Romance, Terror", "História"]
+
+def _respostas(n, inicio=0):
+    return pd.DataFrame({
+        "usuario": [f"leitor{i}" for i in range(inicio, inicio + n)],
+        "idade": [IDADES[i % 3] for i in range(inicio, inicio + n)],
+        "generos": [GENEROS[i % 7 % 3] for i in range(inicio, inicio + n)],
+        "perfil_gerado": [f"perfil {i} " + "x" * 400 for i in range(inicio, inicio + n)],
+    })
+
+def _tokens(df):
+    return int(df["perfil_gerado"].map(estimar_tokens).sum())
+
+def test_populacao_que_cabe_vai_inteira():
+    df = _respostas(10)
+    assert amostra_estratificada(df, orcamento=10_000).equals(df)
+
+def test_vazio_ou_sem_a_coluna():
+    assert amostra_estratificada(pd.DataFrame()).empty
+    assert amostra_estratificada(_respostas(5).drop(columns=["perfil_gerado"])).empty
+
+def test_amostra_nao_depende_da_ordem_das_linhas():
+    df = _respostas(600)
+    amostra = amostra_estratificada(df, orcamento=5000)
+    embaralhada = amostra_estratificada(df.sample(frac=1, random_state=3).reset_index(drop=True), orcamento=5000)
+    assert 0 < len(amostra) < len(df)
+    assert sorted(amostra["usuario"]) == sorted(embaralhada["usuario"])
+
+def test_cada_estrato_recebe_sua_parte():
+    df = _respostas(600)
+    amostra = amostra_estratificada(df, orcamento=6000)
+    assert _tokens(amostra) <= 6000 * 1.1
+    proporcao = df["idade"].value_counts(normalize=True)
+    assert (amostra["idade"].value_counts(normalize=True) - proporcao).abs().max() < 0.1
+
+def test_leitor_novo_so_afeta_o_proprio_estrato():
+    df = _respostas(600)
+    antes = amostra_estratificada(df, orcamento=5000)
+    novo = _respostas(1, inicio=600)
+    depois = amostra_estratificada(pd.concat([df, novo], ignore_index=True), orcamento=5000)
+    estrato = (novo["idade"][0], novo["generos"][0].split(", ")[0])
+    fora = lambda a: set(a["usuario"][(a["idade"] != estrato[0])
+                                      | (a["generos"].str.split(", ").str[0] != estrato[1])])
+    assert fora(antes) == fora(depois)
@@ -0,0 +1,49 @@
+import pytest
+
+import resumo_perfis
+from prompts import estimar_tokens
+from resumo_perfis import dividir_em_lotes, resumir_perfis
+
+def _perfis(n, tamanho=200):
+    return [(f"leitor{i}@2024-01-01T00:00:00", f"perfil {i} " + "x" * tamanho) for i in range(n)]
+
+def test_lotes_respeitam_o_orcamento_e_a_ordem():
+    itens = _perfis(100)
+    lotes = dividir_em_lotes(itens, orcamento=500, perfis_por_lote=20)
+    assert [item for lote in lotes for item in lote] == itens
+    assert all(sum(estimar_tokens(t) for _, t in lote) <= 500 for lote in lotes)
+
+def test_inserir_um_perfil_so_muda_o_lote_dele():
+    itens = _perfis(200)
+    novo = ("leitor_novo@2024-02-01T00:00:00", "perfil novo " + "x" * 200)
+    antes = dividir_em_lotes(itens, orcamento=10_000, perfis_por_lote=8)
+    depois = dividir_em_lotes(itens[:90] + [novo] + itens[90:], orcamento=10_000, perfis_por_lote=8)
+    mudaram = [lote for lote in depois if lote not in antes]
+    assert len(mudaram) == 1 and novo in mudaram[0]
+    assert len(depois) - len(antes) in (0, 1)
+
+@pytest.fixture
+def cache_em_memoria(monkeypatch):
+    cache = {}
+    monkeypatch.setattr(resumo_perfis, "buscar_no_cache", lambda engine, chave, *a: cache.get(chave))
+    monkeypatch.setattr(resumo_perfis, "guardar_no_cache",
+                        lambda engine, chave, modelo, texto: cache.__setitem__(chave, texto))
+    return cache
+
+def test_perfis_que_cabem_vao_inteiros(cache_em_memoria):
+    perfis = _perfis(3, tamanho=10)
+    assert resumir_perfis(None, perfis, gerar=pytest.fail, orcamento=1000) == " ".join(t for _, t in perfis)
+    assert not cache_em_memoria
+
+def test_resumo_cabe_no_orcamento_e_reaproveita_o_cache(cache_em_memoria):
+    chamadas = []
+    def gerar(prompt):
+        chamadas.append(prompt)
+        return f"resumo {len(chamadas)}"
+
+    perfis = _perfis(300)
+    texto = resumir_perfis(None, perfis, gerar, orcamento=2000)
+    assert estimar_tokens(texto) <= 2000 and chamadas
+    feitas = len(chamadas)
+    assert resumir_perfis(None, perfis, gerar, orcamento=2000) == texto
+    assert len(chamadas) == feitas
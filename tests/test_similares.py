@@ -0,0 +1,60 @@
+import random
+
+import numpy as np
+import pytest
+
+from similares import _caracteristicas, _Indice
+
+OPCOES = {
+    "idade": ["18 a 24", "25 a 34", "35 a 44"],
+    "formato_livro": ["Físico", "Digital", "Tanto faz"],
+    "narrativa": ["Ação rápida", "Narrativa introspectiva"],
+    "generos": ["Fantasia", "Romance", "Fantasia, Terror", "História, Romance, Terror"],
+    "autor_favorito": ["Machado de Assis", "machado de  assis", "Clarice Lispector", ""],
+}
+
+def _formulario(rng):
+    return {campo: rng.choice(valores) for campo, valores in OPCOES.items()}
+
+def _cosseno(a, b):
+    a, b = _caracteristicas(a), _caracteristicas(b)
+    produto = sum(peso * b.get(c, 0.0) for c, peso in a.items())
+    return produto / (sum(p * p for p in a.values()) ** 0.5 * sum(p * p for p in b.values()) ** 0.5)
+
+@pytest.fixture
+def leitores():
+    rng = random.Random(7)
+    return {f"leitor{i}": _formulario(rng) for i in range(300)}
+
+def _indice(leitores):
+    indice = _Indice(np)
+    for usuario, dados in leitores.items():
+        indice.gravar(usuario, dados)
+    return indice
+
+def test_ranking_igual_ao_cosseno_calculado_a_mao(leitores):
+    indice = _indice(leitores)
+    consulta = {**leitores["leitor0"], "autor_favorito": "Autor que ninguém citou"}
+    parecidos = indice.parecidos(consulta, usuario="leitor0", k=15)
+    esperado = sorted(((u, _cosseno(consulta, d)) for u, d in leitores.items() if u != "leitor0"),
+                      key=lambda p: -p[1])
+    assert [s for _, s, _ in parecidos] == pytest.approx([s for _, s in esperado[:15]], abs=1e-5)
+    assert all(s == pytest.approx(_cosseno(consulta, leitores[u]), abs=1e-5) for u, s, _ in parecidos)
+    assert "leitor0" not in {u for u, _, _ in parecidos}
+
+def test_leitor_identico_vem_primeiro_com_similaridade_um(leitores):
+    indice = _indice(leitores)
+    usuario, similaridade, (autor, generos) = indice.parecidos(leitores["leitor42"], k=1)[0]
+    assert similaridade == pytest.approx(1.0, abs=1e-5)
+    assert _caracteristicas(leitores[usuario]) == _caracteristicas(leitores["leitor42"])
+
+def test_regravar_troca_a_linha_do_leitor(leitores):
+    indice = _indice(leitores)
+    novo = {"idade": "99+", "formato_livro": "Pergaminho"}
+    indice.gravar("leitor5", novo)
+    assert len(indice.usuarios) == len(leitores)
+    assert indice.parecidos(novo, k=1)[0][:2] == ("leitor5", pytest.approx(1.0, abs=1e-5))
+
+def test_autor_sem_acento_ou_caixa_conta_como_o_mesmo():
+    assert _caracteristicas({"autor_favorito": "Machado de Assis"}) == \
+        _caracteristicas({"autor_favorito": "  machado DE   assis "})
@@ -0,0 +1,95 @@
+# verificar_planos.py
+# Confere os planos das consultas de gamificacao.py: cria um schema descartável,
+# aplica as migrações, popula com dados sintéticos, executa as funções capturando
+# o SQL que elas enviam e roda EXPLAIN em cada SELECT. Termina com erro se alguma
+# consulta fizer Seq Scan nas tabelas da gamificação.
+#
+# Use um Postgres local ou de testes:
+#   python verificar_planos.py --url postgresql+psycopg2://usuario@localhost/litme_testes [--usuarios 20000 --dias 90]
+import argparse
+import json
+import sys
+from sqlalchemy import event, text
+import gamificacao
+from benchmarks.dados_sinteticos import analisar, popular_gamificacao, schema_temporario
+
+SCHEMA = "verificacao_planos"
+TABELAS_VERIFICADAS = {"progresso_leitura", "conquistas", "placar", "usuarios"}
+
+def capturar_consultas(engine, usuario):
+    # Executa as funções de leitura da gamificação e guarda cada SELECT com seus parâmetros
+    consultas = []
+
+    def ao_executar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            consultas.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", ao_executar)
+    try:
+        chamadas = [
+            ("carregar_painel_gamificacao", lambda: gamificacao.carregar_painel_gamificacao(engine, usuario)),
+            ("calcular_pontos_e_nivel", lambda: gamificacao.calcular_pontos_e_nivel(engine, usuario)),
+            ("verificar_conquistas", lambda: gamificacao.verificar_conquistas(engine, usuario)),
+            ("posicao_no_ranking", lambda: gamificacao.posicao_no_ranking(engine, usuario)),
+            ("ranking_top", lambda: gamificacao.ranking_top(engine)),
+            ("validar_desafio", lambda: gamificacao.validar_desafio(engine, usuario)),
+        ]
+        resultado = []
+        for nome, chamada in chamadas:
+            antes = len(consultas)
+            chamada()
+            resultado.extend((nome, sql, parametros) for sql, parametros in consultas[antes:])
+        return resultado
+    finally:
+        event.remove(engine, "before_cursor_execute", ao_executar)
+
+def varreduras_sequenciais(plano):
+    # Percorre a árvore do EXPLAIN (FORMAT JSON) atrás de Seq Scan nas tabelas verificadas
+    if plano.get("Node Type") == "Seq Scan" and plano.get("Relation Name") in TABELAS_VERIFICADAS:
+        yield plano["Relation Name"]
+    for filho in plano.get("Plans", []):
+        yield from varreduras_sequenciais(filho)
+
+def verificar(engine, consultas):
+    falhas = 0
+    conexao = engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        for nome, sql, parametros in consultas:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, parametros)
+            plano = cursor.fetchone()[0]
+            plano = json.loads(plano) if isinstance(plano, str) else plano
+            tabelas = sorted(set(varreduras_sequenciais(plano[0]["Plan"])))
+            if tabelas:
+                falhas += 1
+                print(f"❌ {nome}: Seq Scan em {', '.join(tabelas)}")
+                print("   " + " ".join(sql.split())[:300])
+            else:
+                print(f"✅ {nome}: custo estimado {plano[0]['Plan']['Total Cost']:.1f}")
+    finally:
+        conexao.close()
+    return falhas
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica os planos das consultas de gamificação.")
+    parser.add_argument("--url", required=True, help="URL de um Postgres local ou de testes")
+    parser.add_argument("--usuarios", type=int, default=20000)
+    parser.add_argument("--dias", type=int, default=90)
+    parser.add_argument("--manter", action="store_true", help="não apaga o schema ao final")
+    args = parser.parse_args()
+
+    with schema_temporario(args.url, SCHEMA, manter=args.manter) as engine:
+        print(f"Populando {args.usuarios} leitores x {args.dias} dias...")
+        popular_gamificacao(engine, args.usuarios, args.dias)
+        analisar(engine)
+        # Um leitor do meio do ranking: nem o primeiro nem o último colocado
+        with engine.connect() as conn:
+            usuario = conn.execute(text("""
+                SELECT username FROM placar ORDER BY pontos DESC, username
+                OFFSET (SELECT COUNT(*) / 2 FROM placar) LIMIT 1
+            """)).scalar()
+        falhas = verificar(engine, capturar_consultas(engine, usuario))
+    sys.exit(1 if falhas else 0)
+
+if __name__ == "__main__":
+    main()